@@ -1,14 +1,37 @@
+import base64
+import csv
+import heapq
+import io
+import json
 import os
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_file
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from functools import wraps
+from random import choice
+import click
+from datetime import datetime, timedelta
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_file, Response, stream_with_context, g, has_app_context, has_request_context, before_render_template, template_rendered
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_sqlalchemy import SQLAlchemy
 from flask_admin import Admin
 from flask_admin.contrib.sqla import ModelView
+from wtforms.validators import ValidationError
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_migrate import Migrate, upgrade
 from flask import jsonify
-from sqlalchemy import func
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, literal_column, select, text, tuple_, type_coerce, union_all, update
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import Pool, QueuePool
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import joinedload, make_transient_to_detached
 # ------------------------------------------------------------------------------
 # App & Database Configuration
 # ------------------------------------------------------------------------------
@@ -21,8 +44,80 @@ if database_url.startswith("postgres://"):
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+
+def env_flag(name, default):
+    return os.environ.get(name, "1" if default else "0").lower() in ("1", "true", "yes", "on")
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for `url`, tuned per dialect and overridable from the environment."""
+    # Checks each connection before use so restarts and idle cutoffs don't surface as 500s.
+    options = {"pool_pre_ping": env_flag("DB_POOL_PRE_PING", True)}
+    if make_url(url).get_backend_name() == "postgresql":
+        options.update(
+            # Per worker process. The default ceiling (20) covers the 16 gthread threads.
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 15)),
+            pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+            # Recycle ahead of server/proxy idle timeouts.
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        )
+        statement_timeout = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 0))
+        if statement_timeout:
+            options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
+# Applied to every new SQLite connection. WAL lets readers run alongside the single
+# writer; busy_timeout makes writers wait instead of failing with "database is locked".
+app.config['SQLITE_PRAGMAS'] = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    # Off by default in SQLite; without it the log's user and item references aren't enforced.
+    "foreign_keys": "ON",
+}
+app.config['PLOT_UPDATE_CHUNK_SIZE'] = int(os.environ.get("PLOT_UPDATE_CHUNK_SIZE", 1000))
+# Leave unset for a per-process cache; set to redis://... to share it between workers.
+# Per-process caches with more than one worker also need EVENTS_URL, which is
+# how workers tell each other what changed (see Live Updates).
+app.config['CACHE_URL'] = os.environ.get("CACHE_URL")
+# Any Werkzeug method string, e.g. "scrypt" or "pbkdf2:sha256:260000". Hashes made
+# with anything else are upgraded when their owner next logs in.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+# Seconds a logged-in user's identity is reused without a query; 0 disables.
+app.config['USER_CACHE_TTL'] = int(os.environ.get("USER_CACHE_TTL", 60))
+
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+pool_stats = Counter()
+
+
+@event.listens_for(Engine, "connect")
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+@event.listens_for(Pool, "connect")
+def _count_connect(dbapi_connection, connection_record):
+    pool_stats["connects"] += 1
+
+
+@event.listens_for(Pool, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_stats["checkouts"] += 1
+
+
+@event.listens_for(Pool, "invalidate")
+def _count_invalidate(dbapi_connection, connection_record, exception):
+    pool_stats["invalidated"] += 1
 
 # ------------------------------------------------------------------------------
 # Models
@@ -37,6 +132,11 @@ class Plot(db.Model):
     row = db.Column(db.Integer)
     col = db.Column(db.Integer)
 
+    # One plot per cell; unplaced plots (NULL row/col) don't collide.
+    __table_args__ = (
+        db.Index("uq_plot_row_col", "row", "col", unique=True),
+    )
+
     def __repr__(self):
         return f"<Plot {self.plot_number} [{self.row}, {self.col}] - {self.status}>"
 
@@ -49,31 +149,144 @@ class User(db.Model, UserMixin):
     role = db.Column(db.String(64), nullable=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=app.config['PASSWORD_HASH_METHOD'])
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        """True if the stored hash was made with a different method or cost than configured."""
+        return not self.password_hash.startswith(password_hash_prefix() + "$")
+
+
+_hash_prefixes = {}
+
+
+def password_hash_prefix(method=None):
+    """The "method$" prefix Werkzeug writes for `method`, including its default parameters."""
+    method = method or app.config['PASSWORD_HASH_METHOD']
+    if method not in _hash_prefixes:
+        _hash_prefixes[method] = generate_password_hash("", method=method).split("$", 1)[0]
+    return _hash_prefixes[method]
+
 
 class Stock(db.Model):
+    __table_args__ = (
+        db.Index("ix_stock_category_item", "category", "item"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     item = db.Column(db.String(64), unique=True, nullable=False)
     stock = db.Column(db.Integer, nullable=False)
     used = db.Column(db.Integer, default=0)
     category = db.Column(db.String(64), nullable=False, default="Misc")
+    # Alert once remaining stock drops to this level; 0 only flags items that ran out.
+    reorder_level = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Archived items keep their history (log, rollup, snapshots) but are gone
+    # from every live view, report and export, and can't be used or restocked.
+    archived = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
-    @property
+    @hybrid_property
     def remaining(self):
-        return self.stock - self.used
+        return self.stock - (self.used or 0)
+
+    @remaining.expression
+    def remaining(cls):
+        # Literal 0, not a bound parameter: SQLite only matches ix_stock_headroom
+        # against an identical expression.
+        return cls.stock - func.coalesce(cls.used, literal_column("0"))
+
+    @hybrid_property
+    def headroom(self):
+        """Remaining stock above the reorder level; zero or less means reorder."""
+        return self.remaining - self.reorder_level
+
+
+# Low-stock lookups are a range scan on this expression (headroom <= 0).
+db.Index("ix_stock_headroom", Stock.headroom)
+
+
+# Codes are positions in this list, starting at 1, and are stored in the log;
+# only ever append to it.
+LOG_ACTIONS = ["Item Created", "Restocked", "Usage Logged"]
+
+
+class LogAction(db.TypeDecorator):
+    """An InventoryLog action, stored as its small integer code but read and compared as its name."""
+    impl = db.SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else LOG_ACTIONS.index(value) + 1
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else LOG_ACTIONS[value - 1]
 
 
 class InventoryLog(db.Model):
+    __table_args__ = (
+        db.Index("ix_inventory_log_stock_timestamp", "stock_id", "timestamp"),
+        db.Index("ix_inventory_log_user_timestamp", "user_id", "timestamp"),
+        db.Index("ix_inventory_log_timestamp_id", "timestamp", "id"),
+        db.Index("ix_inventory_log_action_timestamp", "action", "timestamp"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.now, nullable=False)
-    user = db.Column(db.String(64), nullable=False)
-    item = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey("stock.id"), nullable=False)
     quantity_used = db.Column(db.Integer, nullable=False)
-    action = db.Column(db.String(128), nullable=False)
+    action = db.Column(LogAction, nullable=False)
+
+    user = db.relationship(User)
+    stock = db.relationship(Stock)
+
+
+class InventoryLogArchive(db.Model):
+    """InventoryLog rows moved out of the hot table by `flask logs compact`, with their original ids."""
+    __tablename__ = "inventory_log_archive"
+    __table_args__ = (
+        db.Index("ix_inventory_log_archive_timestamp_id", "timestamp", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey("stock.id"), nullable=False)
+    quantity_used = db.Column(db.Integer, nullable=False)
+    action = db.Column(LogAction, nullable=False)
+
+
+class UsageDaily(db.Model):
+    """Per item/user/day/action totals of InventoryLog, kept up to date by record_logs()."""
+    __tablename__ = "usage_daily"
+    __table_args__ = (
+        db.UniqueConstraint("stock_id", "user_id", "day", "action", name="uq_usage_daily_key"),
+        # Covering: windowed reports read everything they need from the index.
+        db.Index("ix_usage_daily_day_stock_action_total", "day", "stock_id", "action", "total"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    stock_id = db.Column(db.Integer, db.ForeignKey("stock.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    action = db.Column(LogAction, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StockSnapshot(db.Model):
+    """Stock and used for every item as of log row `log_id`, written by `flask stock snapshot`."""
+    __tablename__ = "stock_snapshot"
+    __table_args__ = (
+        db.UniqueConstraint("taken_at", "stock_id", name="uq_stock_snapshot_taken_at_stock_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    log_id = db.Column(db.Integer, nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey("stock.id"), nullable=False)
+    stock = db.Column(db.Integer, nullable=False)
+    used = db.Column(db.Integer, nullable=False)
 
 # ------------------------------------------------------------------------------
 # Flask-Login Setup
@@ -84,7 +297,33 @@ login_manager.login_view = "login"
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Runs on every authenticated request. A cached identity needs no query at
+    # all; commits that change a user drop its entry in every worker, and the
+    # TTL bounds staleness for changes made behind the app's back (direct SQL).
+    ttl = app.config['USER_CACHE_TTL']
+    if not ttl:
+        return db.session.get(User, int(user_id))
+    key = f"user:{user_id}"
+    cached = cache.get(key)
+    if cached is not None and cached["expires"] > time.time():
+        user = User(id=cached["id"], username=cached["username"], role=cached["role"])
+        make_transient_to_detached(user)
+        # Attach without a SELECT; password_hash stays unloaded until something reads it.
+        return db.session.merge(user, load=False)
+    user = db.session.get(User, int(user_id))
+    if user is not None:
+        cache.set(key, {"id": user.id, "username": user.username, "role": user.role,
+                        "expires": time.time() + ttl})
+    return user
+
+
+# Covers /register, Flask-Admin edits and password rehashes.
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_row_changed(mapper, connection, target):
+    forget_after_commit(f"user:{target.id}")
+    mark_changed("users")
 
 # ------------------------------------------------------------------------------
 # Flask-Admin Integration
@@ -97,31 +336,1484 @@ class AdminModelView(ModelView):
         return redirect(url_for("login"))
 
 
+class HistoryAdminView(AdminModelView):
+    """Refuses to delete rows that inventory history still refers to; the history would lose its names."""
+    # Columns holding this model's id, checked in order (hot, indexed tables first).
+    history_columns = ()
+    name_attribute = None
+    instead = ""
+
+    def on_model_delete(self, model):
+        for column in self.history_columns:
+            if db.session.query(column).filter(column == model.id).first() is not None:
+                raise ValidationError(f"'{getattr(model, self.name_attribute)}' can't be deleted: "
+                                      f"the inventory history refers to it. {self.instead}")
+
+
+class StockAdminView(HistoryAdminView):
+    history_columns = (InventoryLog.stock_id, UsageDaily.stock_id, StockSnapshot.stock_id,
+                       InventoryLogArchive.stock_id)
+    name_attribute = "item"
+    instead = "Archive it instead."
+
+
+class UserAdminView(HistoryAdminView):
+    history_columns = (InventoryLog.user_id, UsageDaily.user_id, InventoryLogArchive.user_id)
+    name_attribute = "username"
+
+
+class InventoryLogAdminView(AdminModelView):
+    # Read-only: usage_daily, stock and snapshots are all derived from the log,
+    # and an edit here would silently put them out of step.
+    can_create = False
+    can_edit = False
+    can_delete = False
+    column_list = ("timestamp", "user.username", "stock.item", "quantity_used", "action")
+    column_labels = {"user.username": "User", "stock.item": "Item"}
+
+    def get_query(self):
+        # Names for the whole page in the same query, not one lookup per row.
+        return super().get_query().options(joinedload(InventoryLog.user), joinedload(InventoryLog.stock))
+
+
 admin = Admin(app, name='Inventory Admin', template_mode='bootstrap3')
-admin.add_view(AdminModelView(User, db.session))
-admin.add_view(AdminModelView(Stock, db.session))
-admin.add_view(AdminModelView(InventoryLog, db.session))
+admin.add_view(UserAdminView(User, db.session))
+admin.add_view(StockAdminView(Stock, db.session))
+admin.add_view(InventoryLogAdminView(InventoryLog, db.session))
 admin.add_view(AdminModelView(Plot, db.session))
 
+# ------------------------------------------------------------------------------
+# Caching
+# ------------------------------------------------------------------------------
+class LocalCache:
+    """Thread-safe in-process cache with LRU eviction, plus this process's data versions.
+
+    Versions start from a random epoch, so a restarted process never reissues
+    a version (or ETag) an earlier one handed out for different data.
+    """
+    shared = False
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = os.urandom(4).hex()
+        self._versions = Counter()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def versions(self, names):
+        with self._lock:
+            return {name: f"{self._epoch}.{self._versions[name]}" for name in names}
+
+    def bump_versions(self, names):
+        with self._lock:
+            self._versions.update(names)
+
+
+class RedisCache:
+    """Shared cache for multi-worker deployments; needs the optional `redis` package.
+
+    Data versions are Redis counters, so every worker agrees on them.
+    """
+    shared = True
+
+    def __init__(self, url, ttl=3600):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        self.client.set(key, pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def versions(self, names):
+        values = self.client.mget([f"version:{name}" for name in names])
+        return {name: (value or b"0").decode() for name, value in zip(names, values)}
+
+    def bump_versions(self, names):
+        pipe = self.client.pipeline(transaction=False)
+        for name in names:
+            pipe.incr(f"version:{name}")
+        pipe.execute()
+
+
+def make_cache(url):
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisCache(url)
+    return LocalCache()
+
+
+cache = make_cache(app.config['CACHE_URL'])
+cache_stats = {"hits": Counter(), "misses": Counter()}
+
+
+# Kinds of data with a version; each is bumped after any commit that changes it.
+DATA_KINDS = ("stock", "usage", "users")
+
+
+def data_versions():
+    """{name: version} for every kind of data, read from the cache backend once per request.
+
+    No database read: LocalCache answers from memory, Redis with one MGET.
+    """
+    if has_request_context() and "data_versions" in g:
+        return g.data_versions
+    versions = cache.versions(DATA_KINDS)
+    if has_request_context():
+        g.data_versions = versions
+    return versions
+
+
+def data_version(name):
+    """Opaque version of one kind of data ("stock", "usage"); changes after every committed change to it."""
+    return data_versions()[name]
+
+
+def mark_changed(name):
+    """Mark the current transaction as changing `name`; its version is bumped after commit."""
+    db.session.info.setdefault("changed", set()).add(name)
+
+
+def forget_after_commit(key):
+    """Drop cache entry `key` once the current transaction commits."""
+    db.session.info.setdefault("forget", set()).add(key)
+
+
+def stock_changed():
+    mark_changed("stock")
+
+
+def apply_data_changes(names, keys):
+    for key in keys:
+        cache.delete(key)
+    cache.bump_versions(names)
+
+
+@event.listens_for(db.session, "after_commit")
+def _publish_data_changes(session):
+    # After commit, not inside the transaction: writers never queue on a
+    # shared counter. Until the bump lands, readers may briefly see the old
+    # version with the new data, which at worst costs one extra 200.
+    names = sorted(session.info.pop("changed", ()))
+    keys = sorted(session.info.pop("forget", ()))
+    if names or keys:
+        apply_data_changes(names, keys)
+        if not cache.shared and broker.shared:
+            # Other workers' LocalCaches hear about it through the broker (see Live Updates).
+            broker.publish({"type": CACHE_EVENT, "origin": PROCESS_ID, "names": names, "keys": keys})
+    # Later reads in this request must see what was just committed.
+    if has_app_context():
+        g.pop("data_versions", None)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _forget_data_changes(session, previous_transaction):
+    session.info.pop("changed", None)
+    session.info.pop("forget", None)
+
+
+# ORM writes to Stock (create_item, Flask-Admin edits) are caught here; Core
+# UPDATEs call stock_changed() themselves.
+@event.listens_for(Stock, "after_insert")
+@event.listens_for(Stock, "after_update")
+@event.listens_for(Stock, "after_delete")
+def _stock_row_changed(mapper, connection, target):
+    stock_changed()
+
+
+def cached_stock_view(name, build):
+    """Return build() for the current stock version, computing it at most once per version."""
+    key = f"stock:{data_version('stock')}:{name}"
+    value = cache.get(key)
+    if value is None:
+        cache_stats["misses"][name] += 1
+        value = build()
+        cache.set(key, value)
+    else:
+        cache_stats["hits"][name] += 1
+    return value
+
+
+def grouped_stock():
+    """Stock as {category: [item dicts]} with categories and items sorted, cached per stock version."""
+    def build():
+        grouped_items = {}
+        for item in Stock.query.filter(Stock.archived.is_(False)):
+            grouped_items.setdefault(item.category or "Uncategorized", []).append({
+                "item": item.item,
+                "stock": item.stock,
+                "used": item.used,
+                "remaining": item.remaining,
+                "category": item.category
+            })
+        for items in grouped_items.values():
+            items.sort(key=lambda x: x["item"].lower())
+        return dict(sorted(grouped_items.items()))
+
+    return cached_stock_view("grouped", build)
+
+
+def low_stock():
+    """Items at or below their reorder level, most urgent first, cached per stock version."""
+    def build():
+        items = Stock.query.filter(Stock.headroom <= 0, Stock.archived.is_(False)) \
+            .order_by(Stock.headroom, Stock.item).all()
+        return [{
+            "item": item.item,
+            "category": item.category,
+            "remaining": item.remaining,
+            "reorder_level": item.reorder_level,
+            "status": "out" if item.remaining <= 0 else "low"
+        } for item in items]
+
+    return cached_stock_view("low-stock", build)
+
+
+@app.context_processor
+def inject_low_stock_count():
+    # For the navbar badge; a cache lookup unless stock changed since the last page.
+    if not current_user.is_authenticated:
+        return {}
+    return {"low_stock_count": len(low_stock())}
+
+
+def conditional(*names):
+    """Serve a GET view with a strong ETag built from the given data versions.
+
+    Versions change in every worker after each commit (see Caching), so no
+    worker confirms a body another has since made stale. A matching
+    If-None-Match gets a 304 before the view (and its queries) runs, without
+    touching the database.
+    Responses are private and must be revalidated, which is cheap.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = "-".join(f"{name}{data_version(name)}" for name in names)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorator
+
+# ------------------------------------------------------------------------------
+# Live Updates
+# ------------------------------------------------------------------------------
+# Server-Sent Events need a worker that can hold connections open, e.g.
+# gunicorn's gthread (see Procfile) or gevent worker classes.
+app.config['EVENTS_URL'] = os.environ.get("EVENTS_URL")
+# Under gthread every open stream holds one of the worker's GUNICORN_THREADS
+# threads, so streams are capped per worker and the rest are kept for normal
+# requests. Clients over the cap are told to retry later. With a gevent worker
+# streams are cheap and this can be raised well past the thread count.
+app.config['MAX_EVENT_STREAMS'] = int(os.environ.get(
+    "MAX_EVENT_STREAMS", max(1, int(os.environ.get("GUNICORN_THREADS", 16)) // 2)
+))
+
+
+class LocalBroker:
+    """In-process pub/sub: every subscriber gets its own bounded queue.
+
+    A subscriber that stops reading loses events rather than blocking publishers.
+    """
+    shared = False
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def subscribe(self, max_queue=None):
+        subscriber = queue.Queue(self.max_queue if max_queue is None else max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+class RedisBroker:
+    """Fans events out to every worker through Redis pub/sub; needs the optional `redis` package.
+
+    Each process runs one listener thread that relays to a LocalBroker, so
+    subscribing costs no extra Redis connections.
+    """
+    shared = True
+
+    def __init__(self, url, channel="farm-events"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self.local = LocalBroker()
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        self.client.publish(self.channel, json.dumps(message))
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for item in pubsub.listen():
+            self.local.publish(json.loads(item["data"]))
+
+    def subscribe(self, max_queue=None):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+        return self.local.subscribe(max_queue)
+
+    def unsubscribe(self, subscriber):
+        self.local.unsubscribe(subscriber)
+
+
+def make_broker(url):
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url)
+    return LocalBroker()
+
+
+broker = make_broker(app.config['EVENTS_URL'])
+
+# Cache invalidations for other workers travel as broker messages of this
+# type; browsers never see them.
+CACHE_EVENT = "cache"
+PROCESS_ID = os.urandom(8).hex()
+
+if not cache.shared and not broker.shared and int(os.environ.get("WEB_CONCURRENCY", 1)) > 1:
+    # Nothing would tell one worker's LocalCache about another's writes, so
+    # cached pages and ETags would go stale.
+    raise RuntimeError("More than one worker needs a shared cache (CACHE_URL) "
+                       "or event broker (EVENTS_URL) to keep cached data in step.")
+
+
+def _sync_local_cache():
+    # Unbounded queue: a dropped message would leave this worker stale.
+    subscriber = broker.subscribe(max_queue=0)
+    while True:
+        message = subscriber.get()
+        if message["type"] == CACHE_EVENT and message["origin"] != PROCESS_ID:
+            apply_data_changes(message["names"], message["keys"])
+
+
+if not cache.shared and broker.shared:
+    threading.Thread(target=_sync_local_cache, daemon=True).start()
+
+
+def publish_after_commit(message):
+    """Queue a change event; it is only sent if the current transaction commits."""
+    db.session.info.setdefault("events", []).append(message)
+
+
+@event.listens_for(db.session, "after_commit")
+def _publish_events(session):
+    for message in session.info.pop("events", ()):
+        broker.publish(message)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _drop_events(session, previous_transaction):
+    session.info.pop("events", None)
+
+
+def plot_event(plot_id, row, col, crop, status):
+    return {"type": "plot", "id": plot_id, "row": row, "col": col, "crop": crop, "status": status}
+
+# ------------------------------------------------------------------------------
+# Performance Instrumentation
+# ------------------------------------------------------------------------------
+# Off by default: set PERF_INSTRUMENTATION=1 to time queries and templates per
+# request. Stats are per process and kept in fixed-size histograms.
+app.config['PERF_INSTRUMENTATION'] = env_flag("PERF_INSTRUMENTATION", False)
+# The same statement run this many times in one request is logged as a likely N+1.
+app.config['PERF_REPEAT_THRESHOLD'] = int(os.environ.get("PERF_REPEAT_THRESHOLD", 10))
+
+
+class Histogram:
+    """Fixed log-scale buckets (about 12% wide); percentiles are bucket upper bounds."""
+
+    BOUNDS = [0.1 * 1.12 ** i for i in range(128)]  # 0.1 up to ~200000
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.BOUNDS, value)] += 1
+        self.total += 1
+
+    def percentile(self, p):
+        if not self.total:
+            return None
+        rank = p / 100 * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.BOUNDS[min(i, len(self.BOUNDS) - 1)]
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.max_queries = 0
+        self.repeated = 0
+        self.timings = {"total": Histogram(), "db": Histogram(), "render": Histogram(), "queries": Histogram()}
+
+
+perf_stats = {}
+perf_lock = threading.Lock()
+# Most recent N+1 warnings, newest last.
+perf_warnings = deque(maxlen=50)
+
+
+def _perf_before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "perf" in g:
+        conn.info.setdefault("perf_started", []).append(time.perf_counter())
+
+
+def _perf_after_cursor(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("perf_started")
+    if not started or not has_request_context() or "perf" not in g:
+        return
+    g.perf["db"] += time.perf_counter() - started.pop()
+    g.perf["queries"] += 1
+    g.perf["statements"][statement] += 1
+
+
+def _perf_before_render(sender, template, context, **extra):
+    if "perf" in g:
+        g.perf["rendering"].append(time.perf_counter())
+
+
+def _perf_after_render(sender, template, context, **extra):
+    if "perf" in g and g.perf["rendering"]:
+        started = g.perf["rendering"].pop()
+        # Only the outermost render counts, so nested render_template calls aren't added twice.
+        if not g.perf["rendering"]:
+            g.perf["render"] += time.perf_counter() - started
+
+
+def _perf_start():
+    g.perf = {"started": time.perf_counter(), "queries": 0, "db": 0.0, "render": 0.0,
+              "rendering": [], "statements": Counter()}
+
+
+def _perf_finish(response):
+    perf = g.pop("perf", None)
+    if perf is None:
+        return response
+    # For streamed responses this is time to the first byte and the size is unknown.
+    total = (time.perf_counter() - perf["started"]) * 1000
+    db_ms, render_ms = perf["db"] * 1000, perf["render"] * 1000
+    size = None if response.is_streamed else response.calculate_content_length()
+    endpoint = request.endpoint or "<unmatched>"
+
+    repeated = [(statement, count) for statement, count in perf["statements"].items()
+                if count >= app.config['PERF_REPEAT_THRESHOLD']]
+    for statement, count in repeated:
+        app.logger.warning("Possible N+1 in %s: %d x %s", endpoint, count, statement[:200])
+        perf_warnings.append({"endpoint": endpoint, "count": count, "statement": statement[:500],
+                              "at": datetime.now().isoformat(timespec="seconds")})
+
+    with perf_lock:
+        stats = perf_stats.setdefault(endpoint, RouteStats())
+        stats.requests += 1
+        stats.bytes += size or 0
+        stats.max_queries = max(stats.max_queries, perf["queries"])
+        stats.repeated += bool(repeated)
+        stats.timings["total"].add(total)
+        stats.timings["db"].add(db_ms)
+        stats.timings["render"].add(render_ms)
+        stats.timings["queries"].add(perf["queries"])
+
+    response.headers["Server-Timing"] = (
+        f'db;dur={db_ms:.1f};desc="{perf["queries"]} queries", '
+        f"render;dur={render_ms:.1f}, total;dur={total:.1f}"
+    )
+    return response
+
+
+if app.config['PERF_INSTRUMENTATION']:
+    event.listen(Engine, "before_cursor_execute", _perf_before_cursor)
+    event.listen(Engine, "after_cursor_execute", _perf_after_cursor)
+    before_render_template.connect(_perf_before_render, app)
+    template_rendered.connect(_perf_after_render, app)
+    app.before_request(_perf_start)
+    app.after_request(_perf_finish)
+
+
+def perf_summary():
+    """Per-endpoint rows for /admin/perf, slowest p95 first."""
+    rows = []
+    with perf_lock:
+        for endpoint, stats in perf_stats.items():
+            timings = stats.timings
+            rows.append({
+                "endpoint": endpoint,
+                "requests": stats.requests,
+                "p50_ms": round(timings["total"].percentile(50), 1),
+                "p95_ms": round(timings["total"].percentile(95), 1),
+                "db_p50_ms": round(timings["db"].percentile(50), 1),
+                "db_p95_ms": round(timings["db"].percentile(95), 1),
+                "render_p95_ms": round(timings["render"].percentile(95), 1),
+                "queries_p95": round(timings["queries"].percentile(95)),
+                "max_queries": stats.max_queries,
+                "avg_bytes": stats.bytes // stats.requests,
+                "repeated": stats.repeated
+            })
+    return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+
+# ------------------------------------------------------------------------------
+# Stock Mutations
+# ------------------------------------------------------------------------------
+MAX_LOG_BATCH = 500
+
+
+class StockError(Exception):
+    """Raised when a stock change can't be applied (unknown item, not enough stock)."""
+
+
+USAGE_DAILY_KEY = ["stock_id", "user_id", "day", "action"]
+
+
+def _bump_usage_daily(log_rows):
+    """Add a batch of InventoryLog rows (as inserted) to the daily rollup with one upsert."""
+    totals = {}
+    for row in log_rows:
+        key = (row["stock_id"], row["user_id"], row["timestamp"].date(), row["action"])
+        totals[key] = totals.get(key, 0) + row["quantity_used"]
+    values = [
+        dict(zip(USAGE_DAILY_KEY, key), total=total)
+        for key, total in totals.items()
+    ]
+
+    dialect = db.engine.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(UsageDaily)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=USAGE_DAILY_KEY,
+            set_={"total": UsageDaily.total + stmt.excluded.total}
+        )
+        db.session.execute(stmt, values)
+        return
+
+    for value in values:
+        key = [getattr(UsageDaily, column) == value[column] for column in USAGE_DAILY_KEY]
+        bumped = db.session.execute(
+            update(UsageDaily).where(*key).values(total=UsageDaily.total + value["total"])
+            .execution_options(synchronize_session=False)
+        )
+        if bumped.rowcount == 0:
+            db.session.execute(insert(UsageDaily), [value])
+
+
+def _ids_by_name(id_column, name_column, names):
+    """{name: id} for `names`, in one IN query; raises ValueError for names that don't exist."""
+    ids = dict(db.session.query(name_column, id_column).filter(name_column.in_(set(names))))
+    missing = set(names) - set(ids)
+    if missing:
+        raise ValueError(f"Unknown {name_column.key}: {', '.join(sorted(missing))}.")
+    return ids
+
+
+def record_logs(log_rows):
+    """Bulk insert InventoryLog rows and fold them into the daily rollup, without committing.
+
+    Rows name their user and item; the log itself stores their ids.
+    """
+    if not log_rows:
+        return
+    user_ids = _ids_by_name(User.id, User.username, [row["user"] for row in log_rows])
+    stock_ids = _ids_by_name(Stock.id, Stock.item, [row["item"] for row in log_rows])
+    rows = [{
+        "timestamp": row["timestamp"],
+        "user_id": user_ids[row["user"]],
+        "stock_id": stock_ids[row["item"]],
+        "quantity_used": row["quantity_used"],
+        "action": row["action"]
+    } for row in log_rows]
+    db.session.execute(insert(InventoryLog), rows)
+    _bump_usage_daily(rows)
+    mark_changed("usage")
+
+
+def record_log(username, item_name, quantity, action):
+    record_logs([{
+        "timestamp": datetime.now(),
+        "user": username,
+        "item": item_name,
+        "quantity_used": quantity,
+        "action": action
+    }])
+
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def date_bucket(column, granularity):
+    """Truncate a date column to the start of its day, week (Monday) or month.
+
+    Postgres gets date_trunc, SQLite gets date()/strftime() modifiers; both
+    yield the same ISO labels. Filter on the raw column, not on this, so range
+    conditions can still use the index on it.
+    """
+    if granularity == "day":
+        return column
+    if db.engine.dialect.name == "postgresql":
+        return db.cast(func.date_trunc(granularity, db.cast(column, db.DateTime)), db.Date)
+    if granularity == "week":
+        return func.date(column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m-01", column)
+
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _datetime_arg(name, end=False):
+    """Parse an ISO date or datetime argument; a bare `to` date covers that whole day."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def encode_log_cursor(log):
+    raw = json.dumps([log.timestamp.isoformat(), log.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_log_cursor(cursor):
+    timestamp, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(timestamp), int(log_id)
+
+
+def filtered_logs(model=InventoryLog):
+    """`model` query (InventoryLog or its archive) with the user/item/action/from/to filters from the request args.
+
+    User and item names are looked up once in a subquery; the log is only filtered by id.
+    """
+    query = model.query
+    if request.args.get("user"):
+        query = query.filter(model.user_id == select(User.id).where(User.username == request.args["user"])
+                             .scalar_subquery())
+    if request.args.get("item"):
+        query = query.filter(model.stock_id == select(Stock.id).where(Stock.item == request.args["item"])
+                             .scalar_subquery())
+    if request.args.get("action"):
+        if request.args["action"] not in LOG_ACTIONS:
+            return query.filter(db.false())
+        query = query.filter(model.action == request.args["action"])
+    start, end = _datetime_arg("from"), _datetime_arg("to", end=True)
+    if start:
+        query = query.filter(model.timestamp >= start)
+    if end:
+        query = query.filter(model.timestamp < end)
+    return query
+
+
+def rebuild_usage_daily():
+    """Recompute the whole rollup from InventoryLog and its archive, without committing."""
+    # One grouped insert over both tables: a day can straddle the archive cutoff.
+    logs = union_all(*(
+        select(model.stock_id, model.user_id, model.timestamp, model.action, model.quantity_used)
+        for model in (InventoryLog, InventoryLogArchive)
+    )).subquery()
+    day = func.date(logs.c.timestamp)
+    db.session.execute(UsageDaily.__table__.delete())
+    db.session.execute(
+        insert(UsageDaily).from_select(
+            USAGE_DAILY_KEY + ["total"],
+            select(logs.c.stock_id, logs.c.user_id, day, logs.c.action, func.sum(logs.c.quantity_used))
+            .group_by(logs.c.stock_id, logs.c.user_id, day, logs.c.action)
+        )
+    )
+    mark_changed("usage")
+
+
+def _update_stock(item_name, values, *conditions):
+    """Run a single conditional UPDATE on one Stock row and return its new remaining.
+
+    Returns None when no row matched, i.e. the item doesn't exist, is archived
+    or one of the extra conditions failed. The check and the write happen in
+    one statement, so two workers can't both pass the check; Postgres
+    re-evaluates the WHERE clause under the row lock the UPDATE takes.
+    """
+    columns = (Stock.category, Stock.stock, func.coalesce(Stock.used, 0), Stock.remaining)
+    stmt = (
+        update(Stock)
+        .where(Stock.item == item_name, Stock.archived.is_(False), *conditions)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if db.engine.dialect.update_returning:
+        row = db.session.execute(stmt.returning(*columns)).first()
+        if row is None:
+            return None
+    else:
+        if db.session.execute(stmt).rowcount == 0:
+            return None
+        # Still inside the UPDATE's transaction, so this sees our own write.
+        row = db.session.query(*columns).filter(Stock.item == item_name).one()
+
+    category, stock, used, remaining = row
+    stock_changed()
+    publish_after_commit({
+        "type": "stock", "item": item_name, "category": category,
+        "stock": stock, "used": used, "remaining": remaining
+    })
+    return remaining
+
+
+def _missing_or(item_name, message):
+    if db.session.query(Stock.id).filter_by(item=item_name, archived=False).first() is None:
+        return StockError(f"Item '{item_name}' not found.")
+    return StockError(message)
+
+
+def consume_stock(item_name, quantity, username):
+    """Take `quantity` units of an item and log the usage, without committing.
+
+    Returns the new remaining amount or raises StockError.
+    """
+    remaining = _update_stock(
+        item_name,
+        {"used": func.coalesce(Stock.used, 0) + quantity},
+        Stock.remaining >= quantity,
+    )
+    if remaining is None:
+        raise _missing_or(item_name, f"Not enough stock for {item_name}.")
+    record_log(username, item_name, quantity, "Usage Logged")
+    return remaining
+
+
+def consume_stock_batch(entries, username):
+    """Apply many usage entries in one transaction, without committing.
+
+    `entries` is a list of {"item": ..., "quantity": ...} dicts. All Stock rows
+    are fetched with one IN query, every line is validated against a running
+    per-item total, each item gets one conditional UPDATE for its combined
+    quantity and the log rows are inserted in bulk. Lines that fail are skipped
+    and reported; the rest are applied. Returns one result dict per entry.
+    """
+    results = []
+    wanted = {}
+    for index, entry in enumerate(entries):
+        item_name = entry.get("item") if isinstance(entry, dict) else None
+        result = {"index": index, "item": item_name, "success": False}
+        results.append(result)
+        if not isinstance(item_name, str) or not item_name:
+            result["message"] = "Item is required."
+            continue
+        try:
+            quantity = int(entry.get("quantity"))
+        except (AttributeError, TypeError, ValueError):
+            result["message"] = "Invalid quantity."
+            continue
+        if quantity < 1:
+            result["message"] = "Quantity must be at least 1."
+            continue
+        result["quantity"] = quantity
+        wanted.setdefault(item_name, []).append(result)
+
+    if not wanted:
+        return results
+
+    # FOR UPDATE locks the rows on Postgres; SQLite ignores it and relies on
+    # the conditional UPDATE below instead.
+    rows = (
+        db.session.query(Stock.item, Stock.remaining)
+        .filter(Stock.item.in_(list(wanted)), Stock.archived.is_(False))
+        .with_for_update()
+        .all()
+    )
+    available = dict(rows)
+
+    log_rows = []
+    now = datetime.now()
+    for item_name, lines in wanted.items():
+        if item_name not in available:
+            for result in lines:
+                result["message"] = f"Item '{item_name}' not found."
+            continue
+
+        remaining = available[item_name]
+        accepted = []
+        for result in lines:
+            if result["quantity"] > remaining:
+                result["message"] = f"Not enough stock for {item_name}."
+                continue
+            remaining -= result["quantity"]
+            accepted.append(result)
+        if not accepted:
+            continue
+
+        total = sum(result["quantity"] for result in accepted)
+        remaining = _update_stock(
+            item_name,
+            {"used": func.coalesce(Stock.used, 0) + total},
+            Stock.remaining >= total,
+        )
+        if remaining is None:
+            # Someone else used the stock between our read and the update.
+            for result in accepted:
+                result["message"] = f"Not enough stock for {item_name}."
+            continue
+
+        for result in accepted:
+            result["success"] = True
+            result["remaining"] = remaining
+            result["message"] = f"{result['quantity']} units of {item_name} used by {username}."
+            log_rows.append({
+                "timestamp": now,
+                "user": username,
+                "item": item_name,
+                "quantity_used": result["quantity"],
+                "action": "Usage Logged"
+            })
+
+    record_logs(log_rows)
+    return results
+
+
+def restock_item(item_name, quantity, username):
+    """Add `quantity` units to an existing item and log it, without committing.
+
+    Returns the new remaining amount or raises StockError.
+    """
+    remaining = _update_stock(item_name, {"stock": Stock.stock + quantity})
+    if remaining is None:
+        raise StockError(f"Item '{item_name}' not found in stock. Cannot restock non-existing item.")
+    record_log(username, item_name, quantity, "Restocked")
+    return remaining
+
+# ------------------------------------------------------------------------------
+# Stock Ledger
+# ------------------------------------------------------------------------------
+# How each InventoryLog action changes a Stock row; other actions don't.
+LEDGER_COLUMNS = {"Item Created": "stock", "Restocked": "stock", "Usage Logged": "used"}
+
+
+def live_stock_state():
+    """({stock_id: [stock, used]}, id of the last log row those values include).
+
+    Read in one statement so the rows and the log id come from the same
+    snapshot of the database, even while writes are going on.
+
+    Postgres hands out log ids in insert order, not commit order, so a writer
+    could still commit a lower id after the read. Every change to the log
+    writes its Stock row first, in the same transaction; a SHARE lock on
+    stock waits for those writers to commit and holds off new ones until
+    this transaction ends. SQLite writers are serialized, so it needs no lock.
+    """
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(text("LOCK TABLE stock IN SHARE MODE"))
+    last_log = select(func.coalesce(func.max(InventoryLog.id), 0)).scalar_subquery()
+    rows = db.session.query(Stock.id, Stock.stock, func.coalesce(Stock.used, 0), last_log).all()
+    if not rows:
+        return {}, db.session.query(func.coalesce(func.max(InventoryLog.id), 0)).scalar()
+    return {stock_id: [stock, used] for stock_id, stock, used, _ in rows}, rows[0][3]
+
+
+def snapshot_state(before=None):
+    """(taken_at, log_id, {stock_id: [stock, used]}) of the latest snapshot taken before `before`.
+
+    With no such snapshot, the empty state before the first log row.
+    """
+    query = db.session.query(func.max(StockSnapshot.taken_at))
+    if before is not None:
+        query = query.filter(StockSnapshot.taken_at < before)
+    taken_at = query.scalar()
+    if taken_at is None:
+        return None, 0, {}
+    return load_snapshot(taken_at)
+
+
+def load_snapshot(taken_at):
+    rows = db.session.query(StockSnapshot.stock_id, StockSnapshot.stock, StockSnapshot.used, StockSnapshot.log_id) \
+        .filter(StockSnapshot.taken_at == taken_at).all()
+    return taken_at, rows[0][3], {stock_id: [stock, used] for stock_id, stock, used, _ in rows}
+
+
+def replay_logs(state, after_log_id, up_to_log_id=None, before=None):
+    """Apply log rows after `after_log_id` to `state` in place; returns how many were applied.
+
+    The tail is summed per item and action in SQL, so only one row per
+    item/action comes back however long it is. Archived rows count too, so
+    replays from snapshots older than the last compaction still add up.
+    """
+    applied = 0
+    for model in (InventoryLogArchive, InventoryLog):
+        query = db.session.query(
+            model.stock_id, model.action, func.sum(model.quantity_used), func.count()
+        ).filter(model.id > after_log_id, model.action.in_(LEDGER_COLUMNS))
+        if up_to_log_id is not None:
+            query = query.filter(model.id <= up_to_log_id)
+        if before is not None:
+            query = query.filter(model.timestamp < before)
+        for stock_id, action, total, count in query.group_by(model.stock_id, model.action):
+            entry = state.setdefault(stock_id, [0, 0])
+            entry[0 if LEDGER_COLUMNS[action] == "stock" else 1] += total
+            applied += count
+    return applied
+
+
+def take_stock_snapshot():
+    """Record the live stock of every item, without committing. Returns the number of items."""
+    state, log_id = live_stock_state()
+    taken_at = datetime.now()
+    if state:
+        db.session.execute(insert(StockSnapshot), [
+            {"taken_at": taken_at, "log_id": log_id, "stock_id": stock_id, "stock": stock, "used": used}
+            for stock_id, (stock, used) in state.items()
+        ])
+    return len(state)
+
+
+def stock_as_of(ts):
+    """Stock per item at `ts`: the latest snapshot before it plus the log rows after that snapshot."""
+    taken_at, log_id, state = snapshot_state(before=ts)
+    replayed = replay_logs(state, log_id, before=ts)
+    return taken_at, replayed, state
+
+
+def stock_names(stock_ids):
+    """{stock_id: item name} for `stock_ids`, in one IN query; the ledger itself only knows ids."""
+    return dict(db.session.query(Stock.id, Stock.item).filter(Stock.id.in_(set(stock_ids))))
+
+
+def _diff_states(expected, actual, label, names):
+    problems = []
+    for stock_id in sorted(set(expected) | set(actual), key=lambda stock_id: names.get(stock_id, "")):
+        item = names.get(stock_id, f"#{stock_id}")
+        want, got = expected.get(stock_id, [0, 0]), actual.get(stock_id)
+        if got is None:
+            problems.append(f"{label}: {item} is in the ledger (stock={want[0]}, used={want[1]}) but not in stock")
+        elif want != got:
+            problems.append(f"{label}: {item} ledger says stock={want[0]}, used={want[1]}; "
+                            f"found stock={got[0]}, used={got[1]}")
+    return problems
+
+
+def check_stock_ledger(all_snapshots=False):
+    """Check that snapshots plus the log agree with live Stock; returns a list of problems.
+
+    Always replays the latest snapshot (or the whole log, if there is none)
+    forward to the live rows. With `all_snapshots`, also checks that every
+    snapshot after the first is its predecessor plus the log rows in between.
+    The first snapshot is the baseline: stock that predates the log starts there.
+    """
+    problems = []
+    names = dict(db.session.query(Stock.id, Stock.item))
+    if all_snapshots:
+        previous = None
+        for (taken_at,) in db.session.query(StockSnapshot.taken_at).distinct().order_by(StockSnapshot.taken_at):
+            current = load_snapshot(taken_at)
+            if previous is not None:
+                state = {item: list(values) for item, values in previous[2].items()}
+                replay_logs(state, previous[1], up_to_log_id=current[1])
+                problems += _diff_states(state, current[2], f"snapshot {taken_at}", names)
+            previous = current
+
+    live, live_log_id = live_stock_state()
+    taken_at, log_id, state = snapshot_state()
+    replay_logs(state, log_id, up_to_log_id=live_log_id)
+    problems += _diff_states(state, live, f"snapshot {taken_at} + log" if taken_at else "full log", names)
+    return problems
+
+# ------------------------------------------------------------------------------
+# Log Retention
+# ------------------------------------------------------------------------------
+# InventoryLog rows older than this are moved to inventory_log_archive by
+# `flask logs compact`. Reports read usage_daily, which keeps their totals.
+app.config['LOG_RETENTION_DAYS'] = int(os.environ.get("LOG_RETENTION_DAYS", 365))
+app.config['LOG_COMPACT_BATCH_SIZE'] = int(os.environ.get("LOG_COMPACT_BATCH_SIZE", 10000))
+
+
+def compactable_log_filters(cutoff, snapshot_log_id):
+    """Filters for the InventoryLog rows `flask logs compact` may move.
+
+    Only rows the latest snapshot (up to `snapshot_log_id`) already includes,
+    so as-of queries and `flask stock check` after it never need the archive.
+    The newest row always stays, so SQLite can't hand its id out again.
+    """
+    newest = db.session.query(func.coalesce(func.max(InventoryLog.id), 0)).scalar()
+    return (
+        InventoryLog.timestamp < cutoff,
+        InventoryLog.id <= snapshot_log_id,
+        InventoryLog.id < newest,
+    )
+
+
+def compact_logs(cutoff, batch_size, dry_run=False):
+    """Move InventoryLog rows older than `cutoff` into the archive, committing after each batch.
+
+    Snapshots stock first. Each batch is one INSERT ... SELECT and one DELETE
+    over an id range. Yields the running count of moved rows; with `dry_run`,
+    yields the count that would move and changes nothing.
+    """
+    if dry_run:
+        _, snapshot_log_id = live_stock_state()
+        filters = compactable_log_filters(cutoff, snapshot_log_id)
+        yield db.session.query(func.count(InventoryLog.id)).filter(*filters).scalar()
+        return
+
+    take_stock_snapshot()
+    db.session.commit()
+    filters = compactable_log_filters(cutoff, snapshot_state()[1])
+    names = [column.key for column in InventoryLogArchive.__table__.columns]
+    columns = [getattr(InventoryLog, name) for name in names]
+    moved, last_id = 0, 0
+    while True:
+        ids = [
+            log_id for (log_id,) in
+            db.session.query(InventoryLog.id).filter(InventoryLog.id > last_id, *filters)
+            .order_by(InventoryLog.id).limit(batch_size)
+        ]
+        if not ids:
+            return
+        batch = (InventoryLog.id > last_id, InventoryLog.id <= ids[-1], *filters)
+        db.session.execute(
+            insert(InventoryLogArchive).from_select(names, select(*columns).where(*batch))
+        )
+        db.session.execute(delete(InventoryLog).where(*batch))
+        db.session.commit()
+        moved += len(ids)
+        last_id = ids[-1]
+        yield moved
+
+
+def vacuum_logs():
+    """Give the space freed by compaction back and refresh planner statistics."""
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("VACUUM")
+        else:
+            conn.exec_driver_sql("VACUUM ANALYZE inventory_log")
+
+# ------------------------------------------------------------------------------
+# Plot Provisioning
+# ------------------------------------------------------------------------------
+MAX_PROVISION = 100000
+IN_CHUNK = 5000
+
+
+def insert_ignoring_conflicts(model, rows):
+    """Bulk insert rows in one executemany, skipping any that hit a unique constraint.
+
+    Uses ON CONFLICT DO NOTHING on Postgres and SQLite; other databases get a plain
+    insert, so callers should have filtered out known duplicates first. Returns
+    the number of rows actually inserted.
+    """
+    if not rows:
+        return 0
+    dialect = db.engine.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(model).on_conflict_do_nothing()
+    else:
+        stmt = insert(model)
+    if db.engine.dialect.insert_executemany_returning:
+        return len(db.session.execute(stmt.returning(model.id), rows).all())
+    db.session.execute(stmt, rows)
+    return len(rows)
+
+
+def existing_values(column, values):
+    """Which of `values` already exist in `column`, in as few IN queries as possible."""
+    values = list(values)
+    found = set()
+    for offset in range(0, len(values), IN_CHUNK):
+        chunk = values[offset:offset + IN_CHUNK]
+        found.update(value for (value,) in db.session.query(column).filter(column.in_(chunk)))
+    return found
+
+
+def provision_plots(start, end, cols=None, row0=0, col0=0):
+    """Create plots numbered start..end that don't exist yet, without committing.
+
+    With `cols`, plots are laid out row by row in a block `cols` wide starting at
+    (row0, col0); plot `start` goes in the top-left cell. Cells that are already
+    taken are skipped by the unique (row, col) index. Returns (created, skipped).
+    """
+    if end < start:
+        raise ValueError("End plot number must not be below the start.")
+    if end - start + 1 > MAX_PROVISION:
+        raise ValueError(f"At most {MAX_PROVISION} plots can be added at once.")
+
+    numbers = [str(i) for i in range(start, end + 1)]
+    existing = existing_values(Plot.plot_number, numbers)
+
+    rows = []
+    for offset, number in enumerate(numbers):
+        if number in existing:
+            continue
+        row = {"plot_number": number, "crop": None, "status": None, "row": None, "col": None}
+        if cols:
+            row["row"] = row0 + offset // cols
+            row["col"] = col0 + offset % cols
+        rows.append(row)
+
+    created = insert_ignoring_conflicts(Plot, rows)
+    return created, len(numbers) - created
+
+PLOT_CROPS = ["Corn", "Tomato", "Carrot", "Pumpkin", "Sunflower", "Beans", "Lettuce", "Wheat"]
+PLOT_STATUSES = ["Planted", "Needs Water", "Harvest Ready", "Empty"]
+
+
+def iter_plot_id_chunks(filters, chunk_size):
+    """Yield lists of matching plot ids, `chunk_size` at a time, keyed on id."""
+    last_id = 0
+    while True:
+        ids = [
+            plot_id for (plot_id,) in
+            db.session.query(Plot.id).filter(Plot.id > last_id, *filters).order_by(Plot.id).limit(chunk_size)
+        ]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def randomize_plots_in_chunks(chunk_size):
+    """Give every plot a random crop and status, committing after each chunk.
+
+    Only ids are loaded; each chunk is one executemany UPDATE by primary key.
+    Yields the running count of updated plots.
+    """
+    done = 0
+    for ids in iter_plot_id_chunks((), chunk_size):
+        db.session.execute(update(Plot), [
+            {"id": plot_id, "crop": choice(PLOT_CROPS), "status": choice(PLOT_STATUSES)}
+            for plot_id in ids
+        ])
+        db.session.commit()
+        done += len(ids)
+        yield done
+
+
+def set_plot_status_in_chunks(status, filters, chunk_size):
+    """Set `status` on every plot matching `filters`, one UPDATE and commit per chunk.
+
+    Yields the running count of updated plots.
+    """
+    done = 0
+    for ids in iter_plot_id_chunks(filters, chunk_size):
+        db.session.execute(
+            update(Plot).where(Plot.id.in_(ids)).values(status=status)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        done += len(ids)
+        yield done
+
+# ------------------------------------------------------------------------------
+# Bulk Import
+# ------------------------------------------------------------------------------
+MAX_IMPORT_ROWS = 100000
+
+
+class ImportReport:
+    """Outcome of a CSV import: rows created, rows skipped, and per-line errors."""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.created = 0
+        self.skipped = []
+        self.conflicts = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.errors.append({"line": line, "message": message})
+
+    def summary(self, noun):
+        skipped = len(self.skipped) + self.conflicts
+        if self.errors:
+            return (f"Nothing imported: {len(self.errors)} row(s) have errors "
+                    f"({self.created} {noun} valid, {skipped} already existed)")
+        verb = "would be created" if self.dry_run else "created"
+        return f"{self.created} {noun} {verb}, {skipped} already existed"
+
+
+def _csv_rows(stream, required):
+    """Yield (line number, row) from a CSV stream after checking the header."""
+    reader = csv.DictReader(stream)
+    missing = [column for column in required if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+    for line, row in enumerate(reader, 2):
+        if line - 1 > MAX_IMPORT_ROWS:
+            raise ValueError(f"At most {MAX_IMPORT_ROWS} rows can be imported at once.")
+        yield line, {key: (value or "").strip() for key, value in row.items() if key}
+
+
+def import_stock_csv(stream, username, dry_run=False):
+    """Create Stock items from a CSV with item, category and stock columns (reorder_level optional).
+
+    Every row is validated first; if any row is bad nothing is written. Items
+    that already exist are skipped (one IN query). New items and their
+    "Item Created" log rows are bulk inserted in the current transaction,
+    which the caller commits.
+    """
+    if not User.query.filter_by(username=username).first():
+        raise ValueError(f"No user named '{username}' to record the import under.")
+    report = ImportReport(dry_run)
+    new_items = {}
+    for line, row in _csv_rows(stream, ["item", "category", "stock"]):
+        item_name, category = row["item"], row["category"]
+        if not item_name or not category:
+            report.error(line, "item and category are required.")
+            continue
+        if len(item_name) > 64 or len(category) > 64:
+            report.error(line, "item and category must be at most 64 characters.")
+            continue
+        try:
+            stock_amount = int(row["stock"])
+        except ValueError:
+            report.error(line, "Invalid stock amount.")
+            continue
+        if stock_amount < 1:
+            report.error(line, "Stock amount must be at least 1.")
+            continue
+        try:
+            reorder_level = int(row.get("reorder_level") or 0)
+        except ValueError:
+            reorder_level = -1
+        if reorder_level < 0:
+            report.error(line, "Reorder level must be 0 or more.")
+            continue
+        if item_name in new_items:
+            report.error(line, f"Item '{item_name}' appears more than once in the file.")
+            continue
+        new_items[item_name] = {"item": item_name, "category": category, "stock": stock_amount, "used": 0,
+                                "reorder_level": reorder_level}
+
+    existing = existing_values(Stock.item, new_items)
+    report.skipped = sorted(existing)
+    rows = [row for name, row in new_items.items() if name not in existing]
+    report.created = len(rows)
+    if report.errors or dry_run or not rows:
+        return report
+
+    db.session.execute(insert(Stock), rows)
+    stock_changed()
+    now = datetime.now()
+    record_logs([{
+        "timestamp": now,
+        "user": username,
+        "item": row["item"],
+        "quantity_used": row["stock"],
+        "action": "Item Created"
+    } for row in rows])
+    return report
+
+
+def import_plots_csv(stream, dry_run=False):
+    """Create plots from a CSV with row and col columns (plot_number, crop, status optional).
+
+    Validated up front like import_stock_csv. Plot numbers default to "row-col";
+    numbers or cells that are already taken are skipped.
+    """
+    report = ImportReport(dry_run)
+    new_plots = {}
+    cells = set()
+    for line, row in _csv_rows(stream, ["row", "col"]):
+        try:
+            plot_row, plot_col = int(row["row"]), int(row["col"])
+        except ValueError:
+            report.error(line, "Invalid row or col.")
+            continue
+        status = row.get("status") or "Empty"
+        if status not in PLOT_STATUSES:
+            report.error(line, f"Unknown status '{status}'.")
+            continue
+        plot_number = row.get("plot_number") or f"{plot_row}-{plot_col}"
+        if plot_number in new_plots or (plot_row, plot_col) in cells:
+            report.error(line, f"Plot {plot_number} or its cell appears more than once in the file.")
+            continue
+        cells.add((plot_row, plot_col))
+        new_plots[plot_number] = {
+            "plot_number": plot_number,
+            "crop": row.get("crop") or None,
+            "status": status,
+            "row": plot_row,
+            "col": plot_col
+        }
+
+    existing = existing_values(Plot.plot_number, new_plots)
+    rows = [row for number, row in new_plots.items() if number not in existing]
+    report.skipped = sorted(existing)
+    report.created = len(rows)
+    if report.errors or dry_run or not rows:
+        return report
+
+    # Occupied cells are skipped by the unique (row, col) index.
+    report.created = insert_ignoring_conflicts(Plot, rows)
+    report.conflicts = len(rows) - report.created
+    return report
+
+# ------------------------------------------------------------------------------
+# Forecasting
+# ------------------------------------------------------------------------------
+# Days of usage the forecast looks back over. With a 7-day half-life, older days
+# would carry almost no weight, so a longer history doesn't change the answer.
+app.config['FORECAST_HISTORY_DAYS'] = int(os.environ.get("FORECAST_HISTORY_DAYS", 90))
+# Days between placing an order and the stock arriving.
+app.config['FORECAST_LEAD_DAYS'] = int(os.environ.get("FORECAST_LEAD_DAYS", 7))
+# Days of usage a recommended order should cover once it arrives.
+app.config['FORECAST_COVER_DAYS'] = int(os.environ.get("FORECAST_COVER_DAYS", 30))
+FORECAST_HALF_LIFE_DAYS = 7
+# Safety stock multiplier on daily usage spread; about a 95% chance of not running out.
+FORECAST_SERVICE_Z = 1.65
+
+
+def usage_matrix(stock_ids, days):
+    """Daily "Usage Logged" totals for the last `days` days as an items x days array.
+
+    One grouped query on usage_daily (answered from its covering index) is
+    scattered into a zero-filled array; row i is stock_ids[i], the last column is today.
+    """
+    import numpy as np
+    import pandas as pd
+
+    end = datetime.now().date()
+    start = end - timedelta(days=days - 1)
+    result = db.session.execute(
+        # Raw day values: pandas parses them far faster than the ORM's Date type does.
+        select(UsageDaily.stock_id, type_coerce(UsageDaily.day, db.String), func.sum(UsageDaily.total))
+        .where(UsageDaily.day >= start, UsageDaily.action == "Usage Logged")
+        .group_by(UsageDaily.day, UsageDaily.stock_id)
+    )
+    frame = pd.DataFrame(result.all(), columns=["stock_id", "day", "used"])
+    matrix = np.zeros((len(stock_ids), days))
+    if frame.empty:
+        return matrix
+    rows = pd.Index(stock_ids).get_indexer(frame["stock_id"])
+    columns = (pd.to_datetime(frame["day"]) - pd.Timestamp(start)).dt.days.to_numpy()
+    known = (rows >= 0) & (columns >= 0) & (columns < days)
+    np.add.at(matrix, (rows[known], columns[known]), frame["used"].to_numpy(dtype=float)[known])
+    return matrix
+
+
+def build_forecast(history_days, lead_days, cover_days):
+    """Usage rates, days until empty and reorder quantities for every item at once.
+
+    The rate is an exponentially weighted daily mean (recent days count more).
+    Safety stock covers the spread of daily usage over the lead time. Items are
+    returned soonest-to-run-out first; items nobody uses have no days_left.
+    """
+    import numpy as np
+    import pandas as pd
+
+    stock = pd.DataFrame.from_records(
+        db.session.query(Stock.id, Stock.item, Stock.category, Stock.remaining, Stock.reorder_level)
+        .filter(Stock.archived.is_(False)).all(),
+        columns=["id", "item", "category", "remaining", "reorder_level"]
+    )
+    usage = usage_matrix(stock["id"], history_days)
+
+    ages = np.arange(history_days)[::-1]
+    weights = 0.5 ** (ages / FORECAST_HALF_LIFE_DAYS)
+    rate = usage @ weights / weights.sum()
+    spread = usage[:, -30:].std(axis=1)
+    remaining = np.maximum(stock["remaining"].to_numpy(dtype=float), 0)
+
+    safety = FORECAST_SERVICE_Z * spread * np.sqrt(lead_days)
+    reorder_point = rate * lead_days + safety
+    target = rate * (lead_days + cover_days) + safety
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_left = np.where(rate > 0, remaining / rate, np.inf)
+        reorder_in = np.where(rate > 0, np.maximum(remaining - reorder_point, 0) / rate, np.inf)
+
+    result = pd.DataFrame({
+        "item": stock["item"],
+        "category": stock["category"],
+        "remaining": remaining.astype(int),
+        "reorder_level": stock["reorder_level"],
+        "rate_7d": usage[:, -7:].mean(axis=1).round(2),
+        "rate_30d": usage[:, -30:].mean(axis=1).round(2),
+        "rate": rate.round(2),
+        "days_left": days_left.round(1),
+        "reorder_in_days": reorder_in.round(1),
+        "recommended_qty": np.where(rate > 0, np.ceil(np.maximum(target - remaining, 0)), 0).astype(int),
+    }).sort_values(["days_left", "item"])
+    # JSON has no infinity; "never" is null.
+    result = result.replace(np.inf, np.nan)
+    return result.astype(object).where(result.notna(), None).to_dict("records")
+
+
+def forecast():
+    """build_forecast() with the configured settings, cached until usage or stock changes (or the day does)."""
+    settings = (app.config['FORECAST_HISTORY_DAYS'], app.config['FORECAST_LEAD_DAYS'],
+                app.config['FORECAST_COVER_DAYS'])
+    key = (f"forecast:{datetime.now().date()}:{data_version('usage')}:{data_version('stock')}:"
+           + ":".join(map(str, settings)))
+    value = cache.get(key)
+    if value is None:
+        cache_stats["misses"]["forecast"] += 1
+        value = build_forecast(*settings)
+        cache.set(key, value)
+    else:
+        cache_stats["hits"]["forecast"] += 1
+    return value
+
 # ------------------------------------------------------------------------------
 # Routes
 # ------------------------------------------------------------------------------
 @app.route("/inventory")
 @login_required
 def inventory():
-    stocks = Stock.query.all()
-    grouped_items = {}
-    for item in stocks:
-        category = item.category or "Uncategorized"
-        if category not in grouped_items:
-            grouped_items[category] = []
-        grouped_items[category].append(item)
-
-    for items in grouped_items.values():
-        items.sort(key=lambda x: x.item.lower())
-
-    grouped_items = dict(sorted(grouped_items.items()))
-    return render_template("inventory.html", grouped_items=grouped_items, user_role=current_user.role)
+    return render_template("inventory.html", grouped_items=grouped_stock(), low_stock_items=low_stock(),
+                           user_role=current_user.role, max_log_batch=MAX_LOG_BATCH)
 
 @app.route('/create_item', methods=['POST'])
 @login_required
@@ -136,9 +1828,19 @@ def create_item():
     except (TypeError, ValueError):
         flash("Invalid stock amount.", "warning")
         return redirect(url_for('index'))
+    try:
+        reorder_level = int(request.form.get('reorder_level') or 0)
+        if reorder_level < 0:
+            raise ValueError
+    except ValueError:
+        flash("Reorder level must be 0 or more.", "warning")
+        return redirect(url_for('index'))
 
     if item_name and category:
         existing_item = Stock.query.filter_by(item=item_name).first()
+        if existing_item and existing_item.archived:
+            flash(f"Item '{item_name}' is archived; restore it in the admin instead.", "warning")
+            return redirect(url_for('index'))
         if existing_item:
             flash(f"Item '{item_name}' already exists in the system!", "warning")
             return redirect(url_for('index'))
@@ -147,20 +1849,14 @@ def create_item():
             item=item_name,
             stock=stock_amount,
             used=0,
-            category=category
+            category=category,
+            reorder_level=reorder_level
         )
 
         try:
+            # One transaction, so the ledger never has an item without its "Item Created" row.
             db.session.add(new_item)
-            db.session.commit()
-            log = InventoryLog(
-                timestamp=datetime.now(),
-                user=current_user.username,
-                item=item_name,
-                quantity_used=stock_amount,
-                action="Item Created"
-            )
-            db.session.add(log)
+            record_log(current_user.username, item_name, stock_amount, "Item Created")
             db.session.commit()
             flash(f"Item '{item_name}' added under '{category}' by {current_user.username}!", "success")
         except Exception as e:
@@ -181,11 +1877,192 @@ def index():
 @login_required
 def silly():
     return render_template("silly.html", user_role=current_user.role)
+
+
+MIN_GRID_SIZE = 10
+MAX_GRID_SIZE = 500
+MAP_VIEWPORT = 20
+MAX_TILE_SIZE = 100
+
+
+def _int_arg(name, default, low, high):
+    try:
+        value = int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(low, min(value, high))
+
+
+def plot_grid_bounds():
+    """Smallest grid (at least 10x10) that holds every placed plot, from one aggregate query."""
+    max_row, max_col = db.session.query(func.max(Plot.row), func.max(Plot.col)).one()
+    rows = -1 if max_row is None else max_row
+    cols = -1 if max_col is None else max_col
+    return max(MIN_GRID_SIZE, rows + 1), max(MIN_GRID_SIZE, cols + 1)
+
+
+def plots_in_window(row0, col0, rows, cols, *columns):
+    """Plots inside a rectangle, as a range scan on the (row, col) index."""
+    return (
+        db.session.query(*(columns or (Plot,)))
+        .filter(Plot.row.between(row0, row0 + rows - 1), Plot.col.between(col0, col0 + cols - 1))
+        .all()
+    )
+
+
+def build_plot_grid(plots, row0, col0, rows, cols):
+    """Index plots by (row, col) in one pass and shape them into a rows x cols grid.
+
+    grid[r][c] is the Plot at (row0 + r, col0 + c) or None.
+    """
+    by_cell = {(plot.row, plot.col): plot for plot in plots}
+    return [[by_cell.get((row0 + r, col0 + c)) for c in range(cols)] for r in range(rows)]
+
+
 @app.route("/map")
 @login_required
 def map_view():
-    plots = Plot.query.order_by(Plot.plot_number).all()
-    return render_template("farm_map.html", plots=plots, user_role=current_user.role)
+    # Only the first viewport is rendered here; the page fetches the rest as tiles.
+    total_rows, total_cols = plot_grid_bounds()
+    row0 = _int_arg("row0", 0, 0, total_rows - 1)
+    col0 = _int_arg("col0", 0, 0, total_cols - 1)
+    rows = _int_arg("rows", min(total_rows, MAP_VIEWPORT), 1, MAX_TILE_SIZE)
+    cols = _int_arg("cols", min(total_cols, MAP_VIEWPORT), 1, MAX_TILE_SIZE)
+    grid = build_plot_grid(plots_in_window(row0, col0, rows, cols), row0, col0, rows, cols)
+    return render_template(
+        "farm_map.html", grid=grid, row0=row0, col0=col0, rows=rows, cols=cols,
+        total_rows=total_rows, total_cols=total_cols, user_role=current_user.role
+    )
+
+
+@app.route("/api/plots/grid")
+@login_required
+def plot_grid_data():
+    plots = Plot.query.filter(Plot.row.isnot(None), Plot.col.isnot(None)).all()
+    rows, cols = plot_grid_bounds()
+    return jsonify({
+        "rows": rows,
+        "cols": cols,
+        "fields": ["row", "col", "id", "crop", "status"],
+        "plots": [[plot.row, plot.col, plot.id, plot.crop, plot.status] for plot in plots]
+    })
+
+
+@app.route("/api/plots/tile")
+@login_required
+def plot_tile_data():
+    # Tiles start inside the grid; the map never asks for negative cells.
+    row0 = _int_arg("row0", 0, 0, MAX_GRID_SIZE)
+    col0 = _int_arg("col0", 0, 0, MAX_GRID_SIZE)
+    rows = _int_arg("rows", MAP_VIEWPORT, 1, MAX_TILE_SIZE)
+    cols = _int_arg("cols", MAP_VIEWPORT, 1, MAX_TILE_SIZE)
+    plots = plots_in_window(row0, col0, rows, cols, Plot.id, Plot.row, Plot.col, Plot.crop, Plot.status)
+    # Columnar: one array per field instead of one object per plot.
+    return jsonify({
+        "row0": row0,
+        "col0": col0,
+        "rows": rows,
+        "cols": cols,
+        "id": [plot.id for plot in plots],
+        "row": [plot.row for plot in plots],
+        "col": [plot.col for plot in plots],
+        "crop": [plot.crop for plot in plots],
+        "status": [plot.status for plot in plots]
+    })
+
+
+SSE_KEEPALIVE = 15
+# Reconnect delay sent to clients turned away because the worker is full.
+SSE_BUSY_RETRY_MS = 30000
+event_streams = threading.BoundedSemaphore(app.config['MAX_EVENT_STREAMS'])
+
+
+@app.route("/events")
+@login_required
+def events():
+    """Server-Sent Events stream of plot and stock changes."""
+    def generate():
+        # Taken only once streaming starts, so a response that is never sent
+        # can't leak the slot or the subscription.
+        if not event_streams.acquire(blocking=False):
+            yield f"retry: {SSE_BUSY_RETRY_MS}\n\n"
+            return
+        subscriber = broker.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = subscriber.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    # Comment line: keeps proxies from closing an idle stream and
+                    # lets us notice disconnected clients.
+                    yield ": keepalive\n\n"
+                    continue
+                if message["type"] == CACHE_EVENT:
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            broker.unsubscribe(subscriber)
+            event_streams.release()
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+@app.route("/admin/cache-stats")
+@login_required
+def cache_stats_view():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    return jsonify({
+        "backend": type(cache).__name__,
+        "stock_version": data_version("stock"),
+        "usage_version": data_version("usage"),
+        "hits": dict(cache_stats["hits"]),
+        "misses": dict(cache_stats["misses"])
+    })
+
+
+@app.route("/admin/pool-stats")
+@login_required
+def pool_stats_view():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    pool = db.engine.pool
+    stats = {
+        "backend": db.engine.url.get_backend_name(),
+        "pool": type(pool).__name__,
+        "status": pool.status(),
+        "options": {key: value for key, value in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items()
+                    if key != "connect_args"},
+        "connects": pool_stats["connects"],
+        "checkouts": pool_stats["checkouts"],
+        "invalidated": pool_stats["invalidated"]
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow()
+        })
+    if stats["backend"] == "sqlite":
+        stats["pragmas"] = app.config['SQLITE_PRAGMAS']
+    return jsonify(stats)
+
+
+@app.route("/admin/perf")
+@login_required
+def perf_view():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    if request.args.get("format") == "json":
+        return jsonify({"enabled": app.config['PERF_INSTRUMENTATION'], "routes": perf_summary(),
+                        "warnings": list(perf_warnings)})
+    return render_template("perf.html", enabled=app.config['PERF_INSTRUMENTATION'], routes=perf_summary(),
+                           warnings=list(reversed(perf_warnings)), user_role=current_user.role)
 
 
 @app.route("/admin/upgrade-db")
@@ -204,6 +2081,9 @@ def login():
         password = request.form.get("password")
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             flash("Login successful!", "success")
             return redirect(url_for("index"))
@@ -243,11 +2123,11 @@ def register():
 @app.route("/lists")
 @login_required
 def lists():
-    stocks = Stock.query.order_by(Stock.category.asc(), Stock.item.asc()).all()
-    grouped_items = {}
-    for stock in stocks:
-        grouped_items.setdefault(stock.category, []).append(stock)
-    return render_template("lists.html", grouped_items=grouped_items, user_role=current_user.role)
+    # The category tables only change with stock, so render them once per version.
+    stock_tables = cached_stock_view(
+        "lists-fragment", lambda: render_template("stock_tables.html", grouped_items=grouped_stock())
+    )
+    return render_template("lists.html", stock_tables=stock_tables, user_role=current_user.role)
 @app.route("/charts")
 @login_required
 def charts():
@@ -255,15 +2135,51 @@ def charts():
 # API route to get items by category
 @app.route("/api/items/<category>")
 @login_required
+@conditional("stock")
 def get_items_by_category(category):
-    items = Stock.query.filter_by(category=category).all()
+    items = grouped_stock().get(category, [])
     return jsonify([{
-        "item": item.item,
-        "stock": item.stock,
-        "used": item.used,
-        "remaining": item.remaining
+        "item": item["item"],
+        "stock": item["stock"],
+        "used": item["used"],
+        "remaining": item["remaining"]
     } for item in items])
 
+@app.route("/api/low-stock")
+@login_required
+@conditional("stock")
+def low_stock_data():
+    items = low_stock()
+    return jsonify({"count": len(items), "items": items})
+
+
+@app.route("/api/stock/as-of")
+@login_required
+def stock_as_of_data():
+    try:
+        # A bare date means the end of that day.
+        ts = _datetime_arg("ts", end=True)
+    except ValueError:
+        ts = None
+    if ts is None:
+        return jsonify({"success": False, "message": "ts must be an ISO date or datetime."}), 400
+
+    taken_at, replayed, state = stock_as_of(ts)
+    names = stock_names(state)
+    item = request.args.get("item")
+    if item:
+        state = {stock_id: values for stock_id, values in state.items() if names[stock_id] == item}
+    return jsonify({
+        "ts": ts.isoformat(),
+        "snapshot": taken_at.isoformat() if taken_at else None,
+        "replayed": replayed,
+        "items": sorted((
+            {"item": names[stock_id], "stock": stock, "used": used, "remaining": stock - used}
+            for stock_id, (stock, used) in state.items()
+        ), key=lambda row: row["item"])
+    })
+
+
 @app.route("/log", methods=["POST"])
 @login_required
 def log_usage():
@@ -275,28 +2191,45 @@ def log_usage():
     except (TypeError, ValueError):
         return jsonify({"success": False, "message": "Invalid quantity."})
 
-    stock_item = Stock.query.filter_by(item=item_name).first()
-    if not stock_item:
-        return jsonify({"success": False, "message": f"Item '{item_name}' not found."})
+    try:
+        remaining = consume_stock(item_name, quantity_used, current_user.username)
+        db.session.commit()
+    except StockError as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": str(e)})
 
-    if quantity_used > stock_item.remaining:
-        return jsonify({"success": False, "message": f"Not enough stock for {item_name}."})
+    return jsonify({
+        "success": True,
+        "message": f"{quantity_used} units of {item_name} used by {current_user.username}.",
+        "remaining": remaining
+    })
 
-    stock_item.used += quantity_used
+@app.route("/log/batch", methods=["POST"])
+@login_required
+def log_usage_batch():
+    data = request.get_json(silent=True) or {}
+    entries = data.get("entries") if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"success": False, "message": "No entries to log.", "results": []}), 400
+    if len(entries) > MAX_LOG_BATCH:
+        return jsonify({
+            "success": False,
+            "message": f"At most {MAX_LOG_BATCH} entries per batch.",
+            "results": []
+        }), 400
 
-    new_log = InventoryLog(
-        timestamp=datetime.now(),
-        user=current_user.username,
-        item=item_name,
-        quantity_used=quantity_used,
-        action="Usage Logged"
-    )
-    db.session.add(new_log)
-    db.session.commit()
+    try:
+        results = consume_stock_batch(entries, current_user.username)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": f"Error: {str(e)}", "results": []})
 
+    logged = sum(1 for result in results if result["success"])
     return jsonify({
-        "success": True,
-        "message": f"{quantity_used} units of {item_name} used by {current_user.username}."
+        "success": logged == len(results),
+        "message": f"Logged {logged} of {len(results)} entries.",
+        "results": results
     })
 
 @app.route("/add-item", methods=["POST"])
@@ -310,35 +2243,28 @@ def add_item():
     except (TypeError, ValueError):
         return jsonify({"success": False, "message": "Invalid stock value."})
 
-    stock_item = Stock.query.filter_by(item=item_name).first()
-    if not stock_item:
-        return jsonify({
-            "success": False,
-            "message": f"Item '{item_name}' not found in stock. Cannot restock non-existing item."
-        })
-
-    stock_item.stock += stock_val
-
-    new_log = InventoryLog(
-        timestamp=datetime.now(),
-        user=current_user.username,
-        item=item_name,
-        quantity_used=stock_val,
-        action="Restocked"
-    )
-    db.session.add(new_log)
-    db.session.commit()
+    try:
+        remaining = restock_item(item_name, stock_val, current_user.username)
+        db.session.commit()
+    except StockError as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": str(e)})
 
-    return jsonify({"success": True, "message": f"{stock_val} units restocked for {item_name}."})
+    return jsonify({
+        "success": True,
+        "message": f"{stock_val} units restocked for {item_name}.",
+        "remaining": remaining
+    })
 
 
 
 @app.route("/report/most-used-data")
 @login_required
+@conditional("stock")
 def most_used_data():
     data = (
         db.session.query(Stock.item, Stock.used)
-        .filter(Stock.used > 0)
+        .filter(Stock.used > 0, Stock.archived.is_(False))
         .order_by(Stock.used.desc())
         .limit(10)
         .all()
@@ -346,31 +2272,300 @@ def most_used_data():
     return jsonify({item: used for item, used in data})
 @app.route("/report/employee-usage-data")
 @login_required
+@conditional("usage", "users")
 def employee_usage_data():
-    data = (
-        db.session.query(InventoryLog.user, func.sum(InventoryLog.quantity_used))
-        .group_by(InventoryLog.user)
-        .all()
+    totals = (
+        select(UsageDaily.user_id, func.sum(UsageDaily.total).label("total"))
+        .group_by(UsageDaily.user_id)
+        .subquery()
     )
+    # Names are joined onto the totals, so a renamed user keeps their history.
+    data = db.session.query(User.username, totals.c.total).join(totals, totals.c.user_id == User.id).all()
     return jsonify({employee: total for employee, total in data})
 
 @app.route("/report/usage-trends-data")
 @login_required
+@conditional("usage", "stock")
 def usage_trends_data():
+    granularity = request.args.get("granularity", "day")
+    if granularity not in GRANULARITIES:
+        return jsonify({"success": False, "message": "granularity must be day, week or month."}), 400
+    try:
+        start, end = _date_arg("from"), _date_arg("to")
+    except ValueError:
+        return jsonify({"success": False, "message": "from/to must be YYYY-MM-DD dates."}), 400
+
+    bucket = date_bucket(UsageDaily.day, granularity).label("period")
+    query = select(UsageDaily.stock_id, bucket, func.sum(UsageDaily.total).label("total"))
+    if start:
+        query = query.where(UsageDaily.day >= start)
+    if end:
+        query = query.where(UsageDaily.day <= end)
+    totals = query.group_by(UsageDaily.stock_id, bucket).subquery()
     data = (
-        db.session.query(InventoryLog.item, func.strftime('%Y-%m-%d', InventoryLog.timestamp), func.sum(InventoryLog.quantity_used))
-        .group_by(InventoryLog.item, func.strftime('%Y-%m-%d', InventoryLog.timestamp))
-        .order_by(func.strftime('%Y-%m-%d', InventoryLog.timestamp))
+        db.session.query(Stock.item, totals.c.period, totals.c.total)
+        .join(totals, totals.c.stock_id == Stock.id)
+        .order_by(totals.c.period)
         .all()
     )
 
     result = {}
-    for item, date, total in data:
+    for item, period, total in data:
         if item not in result:
             result[item] = {}
-        result[item][date] = total
+        # SQLite hands back strings, Postgres hands back dates.
+        label = period.isoformat() if hasattr(period, "isoformat") else period
+        result[item][label] = total
 
     return jsonify(result)
+
+
+@app.route("/report/forecast-data")
+@login_required
+def forecast_data():
+    items = forecast()
+    limit = _int_arg("limit", len(items), 1, max(len(items), 1))
+    return jsonify({
+        "history_days": app.config['FORECAST_HISTORY_DAYS'],
+        "lead_days": app.config['FORECAST_LEAD_DAYS'],
+        "cover_days": app.config['FORECAST_COVER_DAYS'],
+        "items": items[:limit]
+    })
+
+
+EXPORT_CHUNK = 1000
+LOG_EXPORT_COLUMNS = ["id", "timestamp", "user", "item", "quantity_used", "action"]
+STOCK_EXPORT_COLUMNS = ["item", "category", "stock", "used", "remaining", "reorder_level"]
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file that hands its bytes back on drain() but keeps counting
+    the position, so writers that record offsets (Parquet) stay correct."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _export_response(generate, mimetype, filename):
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+def stream_csv(columns, rows, filename):
+    """Stream rows as CSV, flushing every EXPORT_CHUNK rows."""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if count % EXPORT_CHUNK == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    return _export_response(generate, "text/csv", filename)
+
+
+def stream_parquet(schema, rows, filename):
+    """Stream rows as Parquet, one row group per EXPORT_CHUNK rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def generate():
+        sink = _StreamSink()
+        writer = pq.ParquetWriter(sink, schema)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == EXPORT_CHUNK:
+                writer.write_table(pa.Table.from_pylist([dict(zip(schema.names, r)) for r in batch], schema))
+                batch = []
+                yield sink.drain()
+        if batch:
+            writer.write_table(pa.Table.from_pylist([dict(zip(schema.names, r)) for r in batch], schema))
+        writer.close()
+        yield sink.drain()
+    return _export_response(generate, "application/vnd.apache.parquet", filename)
+
+
+def export_log_rows():
+    """Filtered log rows as plain tuples, fetched EXPORT_CHUNK at a time through a
+    server-side cursor where the driver supports one.
+
+    With ?archive=1, archived rows are merged in by (timestamp, id).
+    """
+    models = (InventoryLogArchive, InventoryLog) if request.args.get("archive") == "1" else (InventoryLog,)
+    queries = [
+        filtered_logs(model)
+        .with_entities(model.id, model.timestamp, User.username, Stock.item, model.quantity_used, model.action)
+        .join(User, User.id == model.user_id)
+        .join(Stock, Stock.id == model.stock_id)
+        .order_by(model.timestamp, model.id)
+        for model in models
+    ]
+    if len(queries) == 1:
+        return queries[0].yield_per(EXPORT_CHUNK)
+    return heapq.merge(*(query.yield_per(EXPORT_CHUNK) for query in queries), key=lambda row: (row[1], row[0]))
+
+
+@app.route("/export/logs.csv")
+@login_required
+def export_logs_csv():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    try:
+        rows = export_log_rows()
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid filter."}), 400
+    return stream_csv(LOG_EXPORT_COLUMNS, rows, "inventory_log.csv")
+
+
+@app.route("/export/logs.parquet")
+@login_required
+def export_logs_parquet():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return jsonify({"success": False, "message": "Parquet export needs the pyarrow package."}), 501
+    try:
+        rows = export_log_rows()
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid filter."}), 400
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("user", pa.string()),
+        ("item", pa.string()),
+        ("quantity_used", pa.int64()),
+        ("action", pa.string())
+    ])
+    return stream_parquet(schema, rows, "inventory_log.parquet")
+
+
+@app.route("/export/stock.csv")
+@login_required
+def export_stock_csv():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    query = db.session.query(
+        Stock.item, Stock.category, Stock.stock, Stock.used, Stock.remaining, Stock.reorder_level
+    ).filter(Stock.archived.is_(False))
+    if request.args.get("category"):
+        query = query.filter(Stock.category == request.args["category"])
+    rows = query.order_by(Stock.category, Stock.item).yield_per(EXPORT_CHUNK)
+    return stream_csv(STOCK_EXPORT_COLUMNS, rows, "stock.csv")
+
+
+def _run_import(importer, noun, back, *args):
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Choose a CSV file to import.", "warning")
+        return redirect(url_for(back))
+
+    dry_run = bool(request.form.get("dry_run"))
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+    try:
+        report = importer(stream, *args, dry_run=dry_run)
+        db.session.commit()
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        flash(f"Error: {str(e)}", "danger")
+        return redirect(url_for(back))
+
+    flash(report.summary(noun), "warning" if report.errors else "success")
+    for error in report.errors[:20]:
+        flash(f"Line {error['line']}: {error['message']}", "warning")
+    if len(report.errors) > 20:
+        flash(f"…and {len(report.errors) - 20} more errors.", "warning")
+    return redirect(url_for(back))
+
+
+@app.route("/admin/import/stock", methods=["POST"])
+@login_required
+def import_stock():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    return _run_import(import_stock_csv, "items", "inventory", current_user.username)
+
+
+@app.route("/admin/import/plots", methods=["POST"])
+@login_required
+def import_plots():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    return _run_import(import_plots_csv, "plots", "plot_manager")
+
+
+LOG_PAGE_SIZE = 50
+MAX_LOG_PAGE_SIZE = 500
+
+
+@app.route("/api/logs")
+@login_required
+def logs_data():
+    if current_user.role != "Admin":
+        return jsonify({"success": False, "message": "Unauthorized"}), 403
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", LOG_PAGE_SIZE)), MAX_LOG_PAGE_SIZE))
+        query = filtered_logs()
+        if request.args.get("cursor"):
+            # Keyset pagination: continue strictly after the last row of the
+            # previous page, newest first, so no OFFSET or COUNT is needed.
+            query = query.filter(
+                tuple_(InventoryLog.timestamp, InventoryLog.id) < tuple_(*decode_log_cursor(request.args["cursor"]))
+            )
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Invalid filter or cursor."}), 400
+
+    # One extra row tells us whether there is a next page.
+    logs = query.options(joinedload(InventoryLog.user), joinedload(InventoryLog.stock)) \
+        .order_by(InventoryLog.timestamp.desc(), InventoryLog.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_log_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return jsonify({
+        "logs": [{
+            "id": log.id,
+            "timestamp": log.timestamp.isoformat(),
+            "user": log.user.username,
+            "item": log.stock.item,
+            "quantity": log.quantity_used,
+            "action": log.action
+        } for log in logs[:limit]],
+        "next": next_cursor
+    })
+
+
+@app.route("/logs")
+@login_required
+def logs_view():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+    return render_template("logs.html", user_role=current_user.role)
+
+
 @app.route("/update-plot/<int:plot_id>", methods=["POST"])
 @login_required
 def update_plot(plot_id):
@@ -387,6 +2582,7 @@ def update_plot(plot_id):
 
     plot.crop = crop if crop else None
     plot.status = status
+    publish_after_commit(plot_event(plot.id, plot.row, plot.col, plot.crop, plot.status))
 
     try:
         db.session.commit()
@@ -394,7 +2590,6 @@ def update_plot(plot_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "message": f"Error: {str(e)}"})
-from random import choice
 
 @app.route("/admin/plot-manager")
 @login_required
@@ -409,14 +2604,20 @@ def add_plots():
     if current_user.role != "Admin":
         return "Unauthorized", 403
 
-    start = int(request.form.get("start", 0))
-    end = int(request.form.get("end", 0))
+    try:
+        start = int(request.form.get("start", 0))
+        end = int(request.form.get("end", 0))
+        cols = int(request.form.get("cols") or 0) or None
+        row0 = int(request.form.get("row0") or 0)
+        col0 = int(request.form.get("col0") or 0)
+        created, skipped = provision_plots(start, end, cols, row0, col0)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        flash(f"Error: {str(e)}", "warning")
+        return redirect(url_for("plot_manager"))
 
-    for i in range(start, end + 1):
-        if not Plot.query.filter_by(plot_number=i).first():
-            db.session.add(Plot(plot_number=i))
-    db.session.commit()
-    flash(f"Added plots {start} to {end}", "success")
+    flash(f"Added plots {start} to {end} ({created} new, {skipped} skipped as existing or occupied)", "success")
     return redirect(url_for("plot_manager"))
 
 @app.route("/admin/reset-plots", methods=["POST"])
@@ -429,22 +2630,75 @@ def reset_plots():
     flash("All plots deleted!", "danger")
     return redirect(url_for("plot_manager"))
 
+def _chunk_size_arg():
+    try:
+        chunk_size = int(request.form.get("chunk_size") or app.config['PLOT_UPDATE_CHUNK_SIZE'])
+    except ValueError:
+        chunk_size = app.config['PLOT_UPDATE_CHUNK_SIZE']
+    return max(1, min(chunk_size, 50000))
+
+
+def _run_plot_job(progress, total, message):
+    """Run a chunked plot update, streaming progress or flashing when it's done.
+
+    The plot manager's JS asks for application/x-ndjson and gets one
+    {"done", "total"} line per chunk; plain form posts redirect back with a flash.
+    """
+    if request.accept_mimetypes.best == "application/x-ndjson":
+        def generate():
+            done = 0
+            for done in progress:
+                yield json.dumps({"done": done, "total": total}) + "\n"
+            yield json.dumps({"done": done, "total": total, "finished": True,
+                              "message": message.format(done=done)}) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    done = 0
+    for done in progress:
+        pass
+    flash(message.format(done=done), "info")
+    return redirect(url_for("plot_manager"))
+
+
 @app.route("/admin/randomize-plots", methods=["POST"])
 @login_required
 def randomize_plots():
     if current_user.role != "Admin":
         return "Unauthorized", 403
 
-    crops = ["Corn", "Tomato", "Carrot", "Pumpkin", "Sunflower", "Beans", "Lettuce", "Wheat"]
-    statuses = ["Planted", "Needs Water", "Harvest Ready", "Empty"]
+    total = Plot.query.count()
+    return _run_plot_job(randomize_plots_in_chunks(_chunk_size_arg()), total, "{done} plots randomized!")
 
-    plots = Plot.query.all()
-    for plot in plots:
-        plot.crop = choice(crops)
-        plot.status = choice(statuses)
-    db.session.commit()
-    flash("All plots randomized!", "info")
-    return redirect(url_for("plot_manager"))
+
+@app.route("/admin/set-plot-status", methods=["POST"])
+@login_required
+def set_plot_status():
+    if current_user.role != "Admin":
+        return "Unauthorized", 403
+
+    status = request.form.get("status")
+    if status not in PLOT_STATUSES:
+        flash("Pick a valid status.", "warning")
+        return redirect(url_for("plot_manager"))
+
+    filters = []
+    if request.form.get("only_status"):
+        filters.append(Plot.status == request.form["only_status"])
+    try:
+        for column, low, high in ((Plot.row, "row_from", "row_to"), (Plot.col, "col_from", "col_to")):
+            if request.form.get(low):
+                filters.append(column >= int(request.form[low]))
+            if request.form.get(high):
+                filters.append(column <= int(request.form[high]))
+    except ValueError:
+        flash("Row and column bounds must be whole numbers.", "warning")
+        return redirect(url_for("plot_manager"))
+
+    total = db.session.query(func.count(Plot.id)).filter(*filters).scalar()
+    return _run_plot_job(
+        set_plot_status_in_chunks(status, filters, _chunk_size_arg()), total,
+        f"{{done}} plots set to {status}."
+    )
 
 @app.route('/add-plot', methods=['POST'])
 def add_plot():
@@ -458,10 +2712,6 @@ def add_plot():
     crop = data.get('crop', '')
     status = data.get('status', 'Empty')
 
-    # Prevent duplicates
-    if Plot.query.filter_by(row=row, col=col).first():
-        return jsonify(success=False, message="Plot already exists at that location"), 400
-
     new_plot = Plot(
         plot_number=f"{row}-{col}",
         crop=crop,
@@ -470,28 +2720,171 @@ def add_plot():
         col=col
     )
 
-    db.session.add(new_plot)
-    db.session.commit()
+    # The unique (row, col) index rejects duplicates, even from concurrent requests.
+    try:
+        db.session.add(new_plot)
+        db.session.flush()
+        publish_after_commit(plot_event(new_plot.id, row, col, new_plot.crop, new_plot.status))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(success=False, message="Plot already exists at that location"), 400
 
     return jsonify(success=True)
 
 @app.route('/move-plot/<int:plot_id>', methods=['POST'])
 def move_plot(plot_id):
     data = request.get_json()
-    row = int(data.get('row'))
-    col = int(data.get('col'))
+    try:
+        row = int(data.get('row'))
+        col = int(data.get('col'))
+    except (TypeError, ValueError):
+        return jsonify(success=False, message="Invalid row or col"), 400
 
-    existing = Plot.query.filter_by(row=row, col=col).first()
-    if existing:
+    stmt = (
+        update(Plot)
+        .where(Plot.id == plot_id)
+        .values(row=row, col=col, plot_number=f"{row}-{col}")
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        if db.engine.dialect.update_returning:
+            moved = db.session.execute(stmt.returning(Plot.crop, Plot.status)).first()
+        elif db.session.execute(stmt).rowcount:
+            moved = db.session.query(Plot.crop, Plot.status).filter(Plot.id == plot_id).first()
+        else:
+            moved = None
+        if moved:
+            publish_after_commit(plot_event(plot_id, row, col, moved.crop, moved.status))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
         return jsonify(success=False, message="Target position already occupied"), 400
 
-    plot = Plot.query.get(plot_id)
-    if plot:
-        plot.row = row
-        plot.col = col
-        plot.plot_number = f"{row}-{col}"
-        db.session.commit()
-        return jsonify(success=True)
-    else:
+    if not moved:
         return jsonify(success=False, message="Plot not found"), 404
+    return jsonify(success=True)
 
+
+# ------------------------------------------------------------------------------
+# CLI Commands
+# ------------------------------------------------------------------------------
+usage_cli = AppGroup("usage", help="Maintain the daily usage rollup.")
+
+
+@usage_cli.command("backfill")
+def backfill_usage_command():
+    """Rebuild usage_daily from the full InventoryLog history."""
+    rebuild_usage_daily()
+    db.session.commit()
+    print(f"usage_daily rebuilt: {UsageDaily.query.count()} rows.")
+
+
+plots_cli = AppGroup("plots", help="Manage farm plots.")
+
+
+@plots_cli.command("provision")
+@click.argument("start", type=int)
+@click.argument("end", type=int)
+@click.option("--cols", type=int, default=None, help="Lay plots out in a block this many columns wide.")
+@click.option("--row0", type=int, default=0, show_default=True, help="Top row of the block.")
+@click.option("--col0", type=int, default=0, show_default=True, help="Left column of the block.")
+def provision_plots_command(start, end, cols, row0, col0):
+    """Create plots numbered START..END that don't exist yet."""
+    try:
+        created, skipped = provision_plots(start, end, cols, row0, col0)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    db.session.commit()
+    print(f"Created {created} plots, skipped {skipped} that already existed or whose cell was taken.")
+
+
+def _print_import_report(report, noun):
+    for error in report.errors:
+        print(f"line {error['line']}: {error['message']}")
+    print(report.summary(noun) + ".")
+    if report.errors:
+        raise SystemExit(1)
+
+
+@plots_cli.command("import")
+@click.argument("path", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--dry-run", is_flag=True, help="Validate the file without writing anything.")
+def import_plots_command(path, dry_run):
+    """Create plots from a CSV with row, col and optional plot_number, crop, status columns."""
+    try:
+        report = import_plots_csv(path, dry_run=dry_run)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    _print_import_report(report, "plots")
+
+
+stock_cli = AppGroup("stock", help="Manage stock items.")
+
+
+@stock_cli.command("import")
+@click.argument("path", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--user", "username", required=True,
+              help="Existing user recorded on the 'Item Created' log rows.")
+@click.option("--dry-run", is_flag=True, help="Validate the file without writing anything.")
+def import_stock_command(path, username, dry_run):
+    """Create stock items from a CSV with item, category and stock columns."""
+    try:
+        report = import_stock_csv(path, username, dry_run=dry_run)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    _print_import_report(report, "items")
+
+
+@stock_cli.command("snapshot")
+def snapshot_stock_command():
+    """Snapshot every item's stock so as-of queries only replay the log after it. Run periodically."""
+    count = take_stock_snapshot()
+    db.session.commit()
+    print(f"Snapshotted {count} items.")
+
+
+@stock_cli.command("check")
+@click.option("--all", "all_snapshots", is_flag=True, help="Also check every snapshot against the one before it.")
+def check_stock_command(all_snapshots):
+    """Check that snapshots plus the log agree with the live stock."""
+    problems = check_stock_ledger(all_snapshots)
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(1)
+    print("Stock, snapshots and log agree.")
+
+
+logs_cli = AppGroup("logs", help="Manage the inventory log.")
+
+
+@logs_cli.command("compact")
+@click.option("--older-than", "days", type=int, default=None,
+              help="Archive rows older than this many days. Defaults to LOG_RETENTION_DAYS.")
+@click.option("--batch-size", type=int, default=None,
+              help="Rows moved per transaction. Defaults to LOG_COMPACT_BATCH_SIZE.")
+@click.option("--dry-run", is_flag=True, help="Count the rows that would move without moving them.")
+@click.option("--vacuum", is_flag=True, help="Reclaim the freed space afterwards.")
+def compact_logs_command(days, batch_size, dry_run, vacuum):
+    """Move old log rows to inventory_log_archive. Exports include them with ?archive=1."""
+    days = app.config['LOG_RETENTION_DAYS'] if days is None else days
+    if days < 1:
+        raise click.BadParameter("must be at least 1.", param_hint="--older-than")
+    cutoff = (datetime.now() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    moved = 0
+    for moved in compact_logs(cutoff, batch_size or app.config['LOG_COMPACT_BATCH_SIZE'], dry_run):
+        if not dry_run:
+            print(f"  {moved} rows archived")
+    print(f"{'Would archive' if dry_run else 'Archived'} {moved} rows from before {cutoff:%Y-%m-%d}.")
+    if vacuum and not dry_run:
+        vacuum_logs()
+        print("Vacuumed.")
+
+
+app.cli.add_command(usage_cli)
+app.cli.add_command(plots_cli)
+app.cli.add_command(stock_cli)
+app.cli.add_command(logs_cli)
@@ -0,0 +1,84 @@
+"""Check that live-update events follow the database transaction.
+
+Runs against the in-process LocalBroker and a throwaway SQLite file, and
+verifies that:
+
+- a stock change is published only once its transaction commits,
+- a rolled-back change publishes nothing,
+- closing an /events stream unsubscribes it from the broker.
+
+    python bench/events_check.py
+"""
+import os
+import queue
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "events.db")
+# Always the in-process broker, even if Redis is configured for the app.
+os.environ.pop("EVENTS_URL", None)
+
+from app import app, broker, db, User, Stock, restock_item  # noqa: E402
+
+ITEM = "events-item"
+USER = "events"
+
+
+def drain(subscriber):
+    messages = []
+    while True:
+        try:
+            messages.append(subscriber.get_nowait())
+        except queue.Empty:
+            return messages
+
+
+def main():
+    problems = []
+    with app.app_context():
+        db.create_all()
+        user = User(username=USER, role="Employee")
+        user.set_password(USER)
+        db.session.add(user)
+        db.session.add(Stock(item=ITEM, stock=10, used=0, category="Events"))
+        db.session.commit()
+
+        subscriber = broker.subscribe()
+        try:
+            restock_item(ITEM, 5, USER)
+            if drain(subscriber):
+                problems.append("event published before commit")
+            db.session.commit()
+            published = drain(subscriber)
+            if [m.get("item") for m in published] != [ITEM]:
+                problems.append(f"expected one event for {ITEM} after commit, got {published}")
+
+            restock_item(ITEM, 5, USER)
+            db.session.rollback()
+            # A later commit must not send the rolled-back change either.
+            db.session.commit()
+            if drain(subscriber):
+                problems.append("rolled-back change was published")
+        finally:
+            broker.unsubscribe(subscriber)
+
+    client = app.test_client()
+    client.post("/login", data={"username": USER, "password": USER})
+    before = len(broker._subscribers)
+    response = client.get("/events")
+    next(iter(response.response))
+    if len(broker._subscribers) != before + 1:
+        problems.append("open /events stream is not subscribed")
+    response.close()
+    if len(broker._subscribers) != before:
+        problems.append("closed /events stream is still subscribed")
+
+    if problems:
+        print("FAILED: " + "; ".join(problems))
+        sys.exit(1)
+    print("OK: events follow commits and closed streams unsubscribe")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Seed a large InventoryLog and compare query plans/timings with and without indexes.
+
+Creates the schema, drops the inventory_log and stock indexes listed below, runs the
+queries behind each route (EXPLAIN + best-of-N timing), creates the indexes
+again and repeats. Uses a throwaway SQLite file unless --database names one;
+an exported DATABASE_URL is ignored, since every table is dropped first:
+
+    python bench/index_benchmark.py --rows 1000000
+    python bench/index_benchmark.py --database postgresql://localhost/farm_bench
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Read before app is imported, because app reads DATABASE_URL at import time.
+_database = argparse.ArgumentParser(add_help=False)
+_database.add_argument("--database")
+os.environ["DATABASE_URL"] = (
+    _database.parse_known_args()[0].database or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+)
+
+from sqlalchemy import func, insert, text  # noqa: E402
+
+from app import app, db, User, Stock, InventoryLog  # noqa: E402
+
+INDEXES = {
+    "stock": ["ix_stock_category_item"],
+    "inventory_log": [
+        "ix_inventory_log_stock_timestamp",
+        "ix_inventory_log_user_timestamp",
+        "ix_inventory_log_timestamp_id",
+        "ix_inventory_log_action_timestamp",
+    ],
+}
+ACTIONS = ["Usage Logged"] * 8 + ["Restocked", "Item Created"]
+
+
+def seed(rows, items, users, chunk=50000):
+    categories = [f"Category {i}" for i in range(max(1, items // 25))]
+    db.session.execute(insert(Stock), [
+        {"item": f"Item {i}", "stock": 10 ** 6, "used": 0, "category": random.choice(categories)}
+        for i in range(items)
+    ])
+    # Fresh tables, so user and item ids are 1-based in insertion order.
+    db.session.execute(insert(User), [
+        {"username": f"user{i}", "role": "Employee", "password_hash": "-"} for i in range(users)
+    ])
+    start = datetime.now() - timedelta(days=730)
+    span = 730 * 24 * 3600
+    for offset in range(0, rows, chunk):
+        db.session.execute(insert(InventoryLog), [
+            {
+                "timestamp": start + timedelta(seconds=random.randrange(span)),
+                "user_id": random.randrange(users) + 1,
+                "stock_id": random.randrange(items) + 1,
+                "quantity_used": random.randint(1, 20),
+                "action": random.choice(ACTIONS),
+            }
+            for _ in range(min(chunk, rows - offset))
+        ])
+        db.session.commit()
+
+
+def route_queries():
+    """The query each route runs against these tables, keyed by route."""
+    day = func.date(InventoryLog.timestamp)
+    month_ago = datetime.now() - timedelta(days=30)
+    return {
+        "/api/items/<category>": db.session.query(Stock).filter_by(category="Category 1"),
+        "/lists": db.session.query(Stock).order_by(Stock.category.asc(), Stock.item.asc()),
+        "employee usage (raw log)": db.session.query(
+            InventoryLog.user_id, func.sum(InventoryLog.quantity_used)
+        ).group_by(InventoryLog.user_id),
+        "item history, last 30 days": db.session.query(
+            day, func.sum(InventoryLog.quantity_used)
+        ).filter(InventoryLog.stock_id == 8, InventoryLog.timestamp >= month_ago).group_by(day),
+        "all activity, last 30 days": db.session.query(
+            InventoryLog.stock_id, func.sum(InventoryLog.quantity_used)
+        ).filter(InventoryLog.timestamp >= month_ago).group_by(InventoryLog.stock_id),
+        "one user's activity": db.session.query(InventoryLog).filter(
+            InventoryLog.user_id == 4
+        ).order_by(InventoryLog.timestamp.desc()).limit(50),
+    }
+
+
+def explain(query):
+    compiled = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if db.engine.dialect.name == "sqlite" else "EXPLAIN "
+    rows = db.session.execute(text(prefix + str(compiled))).all()
+    return [str(row[-1]) for row in rows]
+
+
+def run(label, repeat):
+    print(f"\n=== {label} ===")
+    for name, query in route_queries().items():
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query.all()
+            best = min(best, time.perf_counter() - started)
+        print(f"\n{name}: {best * 1000:.1f} ms")
+        for line in explain(query):
+            print(f"    {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", help="database URL to use (default: a throwaway SQLite file)")
+    parser.add_argument("--rows", type=int, default=1000000, help="InventoryLog rows to seed")
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for names in INDEXES.values():
+            for name in names:
+                db.session.execute(text(f"DROP INDEX {name}"))
+        db.session.commit()
+
+        started = time.perf_counter()
+        seed(args.rows, args.items, args.users)
+        print(f"Seeded {args.rows} log rows on {db.engine.dialect.name} "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        run("before (no indexes)", args.repeat)
+
+        for table_name, names in INDEXES.items():
+            for index in db.metadata.tables[table_name].indexes:
+                if index.name in names:
+                    index.create(db.engine)
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+        run("after (with indexes)", args.repeat)
+
+
+if __name__ == "__main__":
+    main()
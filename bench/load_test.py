@@ -0,0 +1,345 @@
+"""Drive the hot routes under concurrency and report throughput and latency as JSON.
+
+Seeds a synthetic dataset (see bench/seed.py; --no-seed reuses the current
+database), logs one bench user in per thread, then runs each scenario and
+prints per-scenario requests/s and p50/p95/p99 latency. Runs either in
+process through the Flask test client or over HTTP against a local gunicorn
+started with the Procfile settings. Uses a throwaway SQLite file unless
+--database names one; an exported DATABASE_URL is ignored, since seeding drops
+every table:
+
+    python bench/load_test.py --save-baseline bench/baseline-sqlite.json
+    python bench/load_test.py --baseline bench/baseline-sqlite.json
+    python bench/load_test.py --database postgresql://localhost/farm_bench --target gunicorn
+
+With --baseline, exits non-zero if any scenario's p95 or throughput is worse
+than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from http.cookiejar import CookieJar
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Read before app is imported, because app reads DATABASE_URL at import time.
+_database = argparse.ArgumentParser(add_help=False)
+_database.add_argument("--database")
+os.environ["DATABASE_URL"] = (
+    _database.parse_known_args()[0].database or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db")
+)
+
+from app import app, db, User, Stock, Plot, InventoryLog, plot_grid_bounds  # noqa: E402
+import seed  # noqa: E402
+
+
+# Each scenario picks one request: (method, path, form, json body, acceptable statuses).
+def inventory(rng, scale):
+    return "GET", "/inventory", None, None, {200}
+
+
+def lists(rng, scale):
+    return "GET", "/lists", None, None, {200}
+
+
+def farm_map(rng, scale):
+    return "GET", "/map", None, None, {200}
+
+
+def map_tile(rng, scale):
+    rows, cols = scale["grid"]
+    row0, col0 = rng.randrange(0, rows, 32), rng.randrange(0, cols, 32)
+    return "GET", f"/api/plots/tile?row0={row0}&col0={col0}&rows=32&cols=32", None, None, {200}
+
+
+def log_usage(rng, scale):
+    return "POST", "/log", {"item": rng.choice(scale["items"]), "quantity": "1"}, None, {200}
+
+
+def report_most_used(rng, scale):
+    return "GET", "/report/most-used-data", None, None, {200}
+
+
+def report_employee_usage(rng, scale):
+    return "GET", "/report/employee-usage-data", None, None, {200}
+
+
+def report_usage_trends(rng, scale):
+    return "GET", "/report/usage-trends-data?granularity=week", None, None, {200}
+
+
+def move_plot(rng, scale):
+    rows, cols = scale["grid"]
+    plot_id = rng.choice(scale["plot_ids"])
+    # An occupied target cell is a normal 400 outcome, not an error.
+    return ("POST", f"/move-plot/{plot_id}", None,
+            {"row": rng.randrange(rows), "col": rng.randrange(cols)}, {200, 400})
+
+
+SCENARIOS = {
+    "inventory": inventory,
+    "lists": lists,
+    "map": farm_map,
+    "map-tile": map_tile,
+    "log": log_usage,
+    "report-most-used": report_most_used,
+    "report-employee-usage": report_employee_usage,
+    "report-usage-trends": report_usage_trends,
+    "move-plot": move_plot,
+}
+
+
+class ClientSession:
+    """In-process requests through the Flask test client."""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        response = self.client.open(path, method=method, data=form, json=json_body)
+        response.get_data()
+        return response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession:
+    """Real HTTP with a cookie jar; redirects are returned, not followed, to match the test client."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect)
+
+    def request(self, method, path, form=None, json_body=None):
+        headers, data = {}, None
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+        elif json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def wait_for_port(port, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not start listening on port {port}")
+
+
+@contextmanager
+def gunicorn_server(workers, threads, port):
+    proc = subprocess.Popen([
+        sys.executable, "-m", "gunicorn", "--worker-class", "gthread", "--threads", str(threads),
+        "--workers", str(workers), "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "app:app"
+    ], cwd=REPO)
+    try:
+        wait_for_port(port, proc)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))]
+
+
+def run_scenario(name, sessions, requests, warmup, scale):
+    build = SCENARIOS[name]
+    latencies, errors = [], {}
+    lock = threading.Lock()
+
+    def worker(session, count, rng):
+        for i in range(warmup + count):
+            method, path, form, json_body, ok = build(rng, scale)
+            started = time.perf_counter()
+            status = session.request(method, path, form, json_body)
+            elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            with lock:
+                latencies.append(elapsed * 1000)
+                if status not in ok:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+
+    per_thread = [requests // len(sessions) + (i < requests % len(sessions)) for i in range(len(sessions))]
+    threads = [
+        threading.Thread(target=worker, args=(session, count, random.Random(f"{name}-{i}")))
+        for i, (session, count) in enumerate(zip(sessions, per_thread))
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2),
+    }
+
+
+def describe_dataset():
+    """What the scenarios need to know about the seeded data, plus counts for the report."""
+    with app.app_context():
+        return {
+            "backend": db.engine.dialect.name,
+            "users": [name for (name,) in db.session.query(User.username)
+                      .filter(User.username.like("bench-%"), User.role != "Admin").order_by(User.id)],
+            "items": [item for (item,) in db.session.query(Stock.item)],
+            "plot_ids": [plot_id for (plot_id,) in db.session.query(Plot.id)],
+            "grid": plot_grid_bounds(),
+            "log_rows": db.session.query(InventoryLog).count(),
+        }
+
+
+def login(session, username):
+    status = session.request("POST", "/login", {"username": username, "password": seed.PASSWORD})
+    if status != 302 or session.request("GET", "/charts") != 200:
+        raise RuntimeError(f"could not log in as {username}")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a saved run: p95 slower or throughput lower by more than `tolerance`."""
+    if baseline["meta"].get("dataset") != results["meta"]["dataset"]:
+        print("warning: baseline was recorded with a different dataset", file=sys.stderr)
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if sum(current["errors"].values()) and not sum(before["errors"].values()):
+            regressions.append(f"{name}: new errors {current['errors']}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", help="database URL to seed and test (default: a throwaway SQLite file)")
+    seed.add_arguments(parser)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the dataset already in --database")
+    parser.add_argument("--target", choices=["client", "gunicorn"], default="client")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("GUNICORN_THREADS", 16)),
+                        help="gunicorn threads per worker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--requests", type=int, default=400, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per thread per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", help="also write the JSON report here")
+    parser.add_argument("--baseline", help="compare against this saved report")
+    parser.add_argument("--save-baseline", help="write this run's report as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        random.seed(args.seed)
+        with app.app_context():
+            seed.seed(args.users, args.items, args.logs, args.plots, args.fill)
+    dataset = describe_dataset()
+    if len(dataset["users"]) < args.concurrency:
+        parser.error(f"need at least {args.concurrency} bench users, found {len(dataset['users'])}")
+
+    app.config['TESTING'] = True
+    with ExitStack() as stack:
+        if args.target == "gunicorn":
+            base_url = stack.enter_context(gunicorn_server(args.workers, args.threads, args.port))
+            sessions = [HTTPSession(base_url) for _ in range(args.concurrency)]
+        else:
+            sessions = [ClientSession() for _ in range(args.concurrency)]
+        for session, username in zip(sessions, dataset["users"]):
+            login(session, username)
+        scenarios = {}
+        for name in args.scenarios:
+            scenarios[name] = run_scenario(name, sessions, args.requests, args.warmup, dataset)
+            print(f"{name:<24} {scenarios[name]['throughput_rps']:>8} req/s  "
+                  f"p95 {scenarios[name]['p95_ms']} ms", file=sys.stderr)
+
+    results = {
+        "meta": {
+            "backend": dataset["backend"],
+            "target": args.target,
+            "workers": args.workers if args.target == "gunicorn" else None,
+            "threads": args.threads if args.target == "gunicorn" else None,
+            "concurrency": args.concurrency,
+            "dataset": {"users": len(dataset["users"]), "items": len(dataset["items"]),
+                        "logs": dataset["log_rows"], "plots": len(dataset["plot_ids"]),
+                        "grid": list(dataset["grid"])},
+            "revision": git_revision(),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "scenarios": scenarios,
+    }
+    report = json.dumps(results, indent=2)
+    print(report)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                f.write(report + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
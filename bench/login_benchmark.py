@@ -0,0 +1,125 @@
+"""Login and authenticated-request throughput for one worker.
+
+For each password hashing method, logs in from a pool of threads (one worker
+with gthread threads) and reports logins/s. Then times authenticated GETs with
+the user cache disabled and enabled to show what load_user costs per request.
+Uses a throwaway SQLite file unless --database names one; an exported
+DATABASE_URL is ignored, since bench-* accounts are deleted and recreated:
+
+    python bench/login_benchmark.py
+    python bench/login_benchmark.py --methods scrypt pbkdf2:sha256:600000 pbkdf2:sha256:100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Read before app is imported, because app reads DATABASE_URL at import time.
+_database = argparse.ArgumentParser(add_help=False)
+_database.add_argument("--database")
+os.environ["DATABASE_URL"] = (
+    _database.parse_known_args()[0].database or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "login.db")
+)
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app, db, User  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+def run_threads(n_threads, target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(n_threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started
+
+
+def bench_logins(method, n_threads, logins):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    with app.app_context():
+        User.query.filter(User.username.like("bench-%")).delete()
+        for i in range(n_threads):
+            user = User(username=f"bench-{i}", role="Employee")
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+
+    failures = []
+
+    def worker(i):
+        client = app.test_client()
+        for _ in range(logins):
+            response = client.post("/login", data={"username": f"bench-{i}", "password": PASSWORD})
+            if response.status_code != 302 or response.location != "/":
+                failures.append(response.status_code)
+
+    elapsed = run_threads(n_threads, worker)
+    total = n_threads * logins
+    print(f"login  {method:<24} {total / elapsed:8.1f} logins/s "
+          f"({elapsed / total * 1000:.1f} ms each, {n_threads} threads)")
+    if failures:
+        print(f"  {len(failures)} failed logins")
+
+
+def bench_requests(ttl, n_threads, requests_per_thread):
+    app.config['USER_CACHE_TTL'] = ttl
+    queries = []
+    counting = threading.local()
+
+    def count_queries(conn, cursor, statement, *args):
+        # Every statement a measured request runs, not just the user lookup:
+        # whatever load_user needs (a version check, say) is part of its cost.
+        if getattr(counting, "on", False):
+            queries.append(1)
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", count_queries)
+
+    def worker(i):
+        client = app.test_client()
+        client.post("/login", data={"username": f"bench-{i}", "password": PASSWORD})
+        counting.on = True
+        for _ in range(requests_per_thread):
+            client.get("/charts")
+        counting.on = False
+
+    elapsed = run_threads(n_threads, worker)
+    with app.app_context():
+        event.remove(db.engine, "before_cursor_execute", count_queries)
+    total = n_threads * requests_per_thread
+    label = f"user cache ttl={ttl}s" if ttl else "user cache off"
+    print(f"get    {label:<24} {total / elapsed:8.1f} req/s "
+          f"({len(queries)} queries for {total} requests)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", help="database URL to use (default: a throwaway SQLite file)")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=10, help="logins per thread")
+    parser.add_argument("--requests", type=int, default=200, help="authenticated GETs per thread")
+    parser.add_argument("--methods", nargs="+",
+                        default=["scrypt", "pbkdf2:sha256:600000", "pbkdf2:sha256:100000"])
+    args = parser.parse_args()
+
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        backend = db.engine.url.get_backend_name()
+    print(f"{backend}, one worker")
+
+    for method in args.methods:
+        bench_logins(method, args.threads, args.logins)
+    for ttl in (0, 60):
+        bench_requests(ttl, args.threads, args.requests)
+
+
+if __name__ == "__main__":
+    main()
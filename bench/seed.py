@@ -0,0 +1,133 @@
+"""Seed a synthetic dataset at a configurable scale for benchmarks.
+
+Recreates the schema and fills in users (bench-0..N, plus bench-admin; the
+password for all of them is "bench"), stock items, InventoryLog rows spread
+over the last two years, and a square farm grid with some empty cells. The
+usage_daily rollup is rebuilt at the end. DATABASE_URL picks the database and
+is required, since every table is dropped first:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python bench/seed.py --logs 1000000
+    DATABASE_URL=postgresql://localhost/farm_bench python bench/seed.py --plots 10000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if __name__ == "__main__" and not os.environ.get("DATABASE_URL"):
+    # seed() drops every table; never fall back to the app's own database.
+    sys.exit("Set DATABASE_URL to the database to seed (its tables are dropped first).")
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import (  # noqa: E402
+    app, db, User, Stock, InventoryLog, Plot, PLOT_CROPS, PLOT_STATUSES, rebuild_usage_daily
+)
+
+PASSWORD = "bench"
+ACTIONS = ["Usage Logged"] * 8 + ["Restocked", "Item Created"]
+
+
+def user_names(users):
+    return [f"bench-{i}" for i in range(users)]
+
+
+def item_names(items):
+    return [f"Item {i}" for i in range(items)]
+
+
+def grid_side(plots, fill):
+    return max(1, math.ceil(math.sqrt(plots / fill)))
+
+
+def seed_users(users):
+    # Hash once and reuse it: seeding shouldn't cost users x scrypt.
+    template = User(username="bench-admin", role="Admin")
+    template.set_password(PASSWORD)
+    db.session.execute(insert(User), [
+        {"username": name, "role": "Employee", "password_hash": template.password_hash}
+        for name in user_names(users)
+    ] + [{"username": "bench-admin", "role": "Admin", "password_hash": template.password_hash}])
+
+
+def seed_stock(items):
+    categories = [f"Category {i}" for i in range(max(1, items // 25))]
+    # Effectively unlimited, so /log never runs out during a run.
+    db.session.execute(insert(Stock), [
+        {"item": name, "stock": 10 ** 9, "used": 0, "category": random.choice(categories)}
+        for name in item_names(items)
+    ])
+
+
+def seed_logs(logs, users, chunk=50000):
+    items = [stock_id for (stock_id,) in db.session.query(Stock.id)]
+    users = [user_id for (user_id,) in db.session.query(User.id).filter(User.username.in_(user_names(users)))]
+    start = datetime.now() - timedelta(days=730)
+    span = 730 * 24 * 3600
+    for offset in range(0, logs, chunk):
+        db.session.execute(insert(InventoryLog), [
+            {
+                "timestamp": start + timedelta(seconds=random.randrange(span)),
+                "user_id": random.choice(users),
+                "stock_id": random.choice(items),
+                "quantity_used": random.randint(1, 20),
+                "action": random.choice(ACTIONS),
+            }
+            for _ in range(min(chunk, logs - offset))
+        ])
+        db.session.commit()
+
+
+def seed_plots(plots, fill):
+    side = grid_side(plots, fill)
+    cells = random.sample(range(side * side), min(plots, side * side))
+    rows = [
+        {"row": cell // side, "col": cell % side, "plot_number": f"{cell // side}-{cell % side}",
+         "crop": random.choice(PLOT_CROPS), "status": random.choice(PLOT_STATUSES)}
+        for cell in cells
+    ]
+    for offset in range(0, len(rows), 10000):
+        db.session.execute(insert(Plot), rows[offset:offset + 10000])
+
+
+def seed(users=20, items=500, logs=100000, plots=2500, fill=0.8):
+    db.drop_all()
+    db.create_all()
+    seed_users(users)
+    seed_stock(items)
+    seed_plots(plots, fill)
+    db.session.commit()
+    seed_logs(logs, users)
+    rebuild_usage_daily()
+    db.session.commit()
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--logs", type=int, default=100000, help="InventoryLog rows")
+    parser.add_argument("--plots", type=int, default=2500)
+    parser.add_argument("--fill", type=float, default=0.8, help="fraction of grid cells with a plot")
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for repeatable datasets")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.users, args.items, args.logs, args.plots, args.fill)
+        print(f"Seeded {args.users} users, {args.items} items, {args.logs} log rows and "
+              f"{args.plots} plots on {db.engine.dialect.name} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
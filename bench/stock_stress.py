@@ -0,0 +1,127 @@
+"""Concurrent stress check for the stock mutation helpers.
+
+Hammers a single item from many threads and verifies that no update was lost
+and stock never went negative. Runs against a throwaway SQLite file unless
+--database names one (e.g. a local Postgres); an exported DATABASE_URL is
+ignored, since the stress item's history is deleted first:
+
+    python bench/stock_stress.py
+    python bench/stock_stress.py --database postgresql://localhost/farm_stress
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Read before app is imported, because app reads DATABASE_URL at import time.
+_database = argparse.ArgumentParser(add_help=False)
+_database.add_argument("--database")
+os.environ["DATABASE_URL"] = (
+    _database.parse_known_args()[0].database or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "stress.db")
+)
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import (  # noqa: E402
+    app, db, User, Stock, InventoryLog, InventoryLogArchive, UsageDaily, StockSnapshot,
+    StockError, consume_stock, restock_item
+)
+
+ITEM = "stress-item"
+USER = "stress"
+
+
+def worker(n_ops, quantity, restock_every, counts, lock):
+    with app.app_context():
+        for i in range(n_ops):
+            while True:
+                try:
+                    if restock_every and i % restock_every == 0:
+                        restock_item(ITEM, quantity, USER)
+                        key = "restocked"
+                    else:
+                        consume_stock(ITEM, quantity, USER)
+                        key = "used"
+                    db.session.commit()
+                except StockError:
+                    db.session.rollback()
+                    key = "rejected"
+                except OperationalError:
+                    # SQLite busy timeout; try the same operation again.
+                    db.session.rollback()
+                    continue
+                break
+            with lock:
+                counts[key] += 1
+        db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", help="database URL to use (default: a throwaway SQLite file)")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    parser.add_argument("--stock", type=int, default=1000)
+    parser.add_argument("--quantity", type=int, default=3)
+    parser.add_argument("--restock-every", type=int, default=10,
+                        help="every Nth op restocks instead of consuming (0 = never)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        old = Stock.query.filter_by(item=ITEM).first()
+        if old:
+            for model in (InventoryLog, InventoryLogArchive, UsageDaily, StockSnapshot):
+                model.query.filter_by(stock_id=old.id).delete()
+            db.session.delete(old)
+        if not User.query.filter_by(username=USER).first():
+            user = User(username=USER, role="Employee")
+            user.set_password(USER)
+            db.session.add(user)
+        db.session.add(Stock(item=ITEM, stock=args.stock, used=0, category="Stress"))
+        db.session.commit()
+
+    counts = {"used": 0, "restocked": 0, "rejected": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(args.ops, args.quantity, args.restock_every, counts, lock))
+        for _ in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        item = Stock.query.filter_by(item=ITEM).one()
+        logged_used = InventoryLog.query.filter_by(stock_id=item.id, action="Usage Logged").count()
+        logged_restock = InventoryLog.query.filter_by(stock_id=item.id, action="Restocked").count()
+        expected_stock = args.stock + counts["restocked"] * args.quantity
+        expected_used = counts["used"] * args.quantity
+        problems = []
+        if item.stock != expected_stock:
+            problems.append(f"stock {item.stock} != expected {expected_stock}")
+        if item.used != expected_used:
+            problems.append(f"used {item.used} != expected {expected_used}")
+        if item.remaining < 0:
+            problems.append(f"remaining went negative: {item.remaining}")
+        if logged_used != counts["used"] or logged_restock != counts["restocked"]:
+            problems.append("log rows don't match applied operations")
+        backend = db.engine.url.get_backend_name()
+
+    total = sum(counts.values())
+    print(f"{backend}: {total} ops in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} ops/s) {counts}")
+    if problems:
+        print("FAILED: " + "; ".join(problems))
+        sys.exit(1)
+    print(f"OK: stock={item.stock} used={item.used} remaining={item.remaining}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Indexes for keyset pagination over inventory_log
+
+Revision ID: 0c94e1d6a8b2
+Revises: f27a8d0b5e61
+Create Date: 2026-10-18 16:05:48.220915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c94e1d6a8b2'
+down_revision = 'f27a8d0b5e61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inventory_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_log_timestamp')
+        batch_op.create_index('ix_inventory_log_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_inventory_log_action_timestamp', ['action', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inventory_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_log_action_timestamp')
+        batch_op.drop_index('ix_inventory_log_timestamp_id')
+        batch_op.create_index('ix_inventory_log_timestamp', ['timestamp'], unique=False)
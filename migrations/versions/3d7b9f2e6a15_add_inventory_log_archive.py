@@ -0,0 +1,40 @@
+"""Add inventory_log_archive for compacted log rows
+
+Revision ID: 3d7b9f2e6a15
+Revises: e8f1a4c3b692
+Create Date: 2026-10-18 22:14:51.640217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d7b9f2e6a15'
+down_revision = 'e8f1a4c3b692'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventory_log_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('user', sa.String(length=64), nullable=False),
+    sa.Column('item', sa.String(length=64), nullable=False),
+    sa.Column('quantity_used', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=128), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_inventory_log_archive_timestamp_id', 'inventory_log_archive',
+                    ['timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    # Put archived rows back rather than dropping them with the table.
+    op.execute(
+        'INSERT INTO inventory_log (id, timestamp, "user", item, quantity_used, action) '
+        'SELECT id, timestamp, "user", item, quantity_used, action FROM inventory_log_archive'
+    )
+    op.drop_index('ix_inventory_log_archive_timestamp_id', table_name='inventory_log_archive')
+    op.drop_table('inventory_log_archive')
@@ -0,0 +1,36 @@
+"""Add indexes for inventory_log and stock access paths
+
+Revision ID: 5b8f0a61c2de
+Revises: d4e2b7f90c13
+Create Date: 2026-10-18 11:26:09.337150
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8f0a61c2de'
+down_revision = 'd4e2b7f90c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inventory_log', schema=None) as batch_op:
+        batch_op.create_index('ix_inventory_log_item_timestamp', ['item', 'timestamp'], unique=False)
+        batch_op.create_index('ix_inventory_log_user_timestamp', ['user', 'timestamp'], unique=False)
+        batch_op.create_index('ix_inventory_log_timestamp', ['timestamp'], unique=False)
+
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_category_item', ['category', 'item'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_category_item')
+
+    with op.batch_alter_table('inventory_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_log_timestamp')
+        batch_op.drop_index('ix_inventory_log_user_timestamp')
+        batch_op.drop_index('ix_inventory_log_item_timestamp')
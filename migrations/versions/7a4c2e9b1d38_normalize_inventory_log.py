@@ -0,0 +1,187 @@
+"""Store inventory log users and items as foreign keys and actions as small ints
+
+Revision ID: 7a4c2e9b1d38
+Revises: 3d7b9f2e6a15
+Create Date: 2026-10-18 23:05:12.903514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4c2e9b1d38'
+down_revision = '3d7b9f2e6a15'
+branch_labels = None
+depends_on = None
+
+# Must match LOG_ACTIONS in app.py: codes are positions starting at 1.
+ACTIONS = ['Item Created', 'Restocked', 'Usage Logged']
+BATCH_SIZE = 10000
+TABLES = ['inventory_log', 'inventory_log_archive']
+
+user = sa.table('user', sa.column('id'), sa.column('username'), sa.column('password_hash'), sa.column('role'))
+stock = sa.table('stock', sa.column('id'), sa.column('item'), sa.column('stock'), sa.column('used'),
+                 sa.column('category'), sa.column('archived'))
+
+
+def log_table(name):
+    return sa.table(
+        name, sa.column('id'), sa.column('user'), sa.column('item'), sa.column('action'), sa.column('quantity_used'),
+        sa.column('user_id'), sa.column('stock_id'), sa.column('action_code')
+    )
+
+
+def batches(conn, log, pending):
+    """(low, high] id ranges of at most BATCH_SIZE ids covering the `pending` rows of `log`."""
+    low, high = conn.execute(sa.select(sa.func.min(log.c.id), sa.func.max(log.c.id)).where(pending)).one()
+    if low is None:
+        return
+    for start in range(low - 1, high, BATCH_SIZE):
+        yield start, start + BATCH_SIZE
+
+
+def backfill(conn, log, pending, **values):
+    """Set `values` on the `pending` rows of `log` one id batch at a time, committing each.
+
+    Only rows still pending are touched, so a run that stopped part way picks
+    up where it left off.
+    """
+    with op.get_context().autocommit_block():
+        for low, high in batches(conn, log, pending):
+            conn.execute(log.update().where(log.c.id > low, log.c.id <= high, pending).values(**values))
+
+
+def missing_columns(conn, name, columns):
+    existing = {column['name'] for column in sa.inspect(conn).get_columns(name)}
+    return [column for column in columns if column.name not in existing]
+
+
+def upgrade():
+    conn = op.get_bind()
+    logs = [log_table(name) for name in TABLES]
+
+    orphans = set()
+    for log in logs:
+        orphans |= set(conn.execute(
+            sa.select(log.c.item).distinct().where(~log.c.item.in_(sa.select(stock.c.item)))
+        ).scalars())
+    unknown = set()
+    for log in logs:
+        unknown |= set(conn.execute(
+            sa.select(log.c.user).distinct().where(~log.c.user.in_(sa.select(user.c.username)))
+        ).scalars())
+    unknown_actions = set()
+    for log in logs:
+        unknown_actions |= set(conn.execute(
+            sa.select(log.c.action).distinct().where(~log.c.action.in_(ACTIONS))
+        ).scalars())
+    if unknown_actions:
+        raise RuntimeError('unknown inventory log actions: ' + ', '.join(sorted(unknown_actions)))
+    # Deleted accounts and names like "import" keep their history as accounts
+    # nobody can log in to ("!" never matches a password).
+    if unknown:
+        op.bulk_insert(user, [
+            {'username': name, 'password_hash': '!', 'role': 'Employee'} for name in sorted(unknown)
+        ])
+    # Likewise deleted items keep theirs on archived placeholder items whose
+    # stock and used are what the log adds up to, so the stock check still
+    # balances without the items showing up anywhere live.
+    # Added in place: a batch rebuild of stock would lose ix_stock_headroom.
+    for column in missing_columns(conn, 'stock', [
+        sa.Column('archived', sa.Boolean(), nullable=False, server_default=sa.false()),
+    ]):
+        op.add_column('stock', column)
+    for name in sorted(orphans):
+        totals = {'stock': 0, 'used': 0}
+        for log in logs:
+            for action, total in conn.execute(
+                sa.select(log.c.action, sa.func.sum(log.c.quantity_used))
+                .where(log.c.item == name).group_by(log.c.action)
+            ):
+                if action == 'Usage Logged':
+                    totals['used'] += total
+                else:
+                    totals['stock'] += total
+        conn.execute(stock.insert().values(item=name, category='Misc', archived=True, **totals))
+
+    for name in TABLES:
+        columns = missing_columns(conn, name, [
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('stock_id', sa.Integer(), nullable=True),
+            sa.Column('action_code', sa.SmallInteger(), nullable=True),
+        ])
+        if columns:
+            with op.batch_alter_table(name, schema=None) as batch_op:
+                for column in columns:
+                    batch_op.add_column(column)
+
+    # Large logs are converted in committed batches so no single transaction
+    # holds the whole table; everything above is committed with the first one.
+    for log in logs:
+        backfill(
+            conn, log, log.c.user_id.is_(None),
+            user_id=sa.select(user.c.id).where(user.c.username == log.c.user).scalar_subquery(),
+            stock_id=sa.select(stock.c.id).where(stock.c.item == log.c.item).scalar_subquery(),
+            action_code=sa.case({action: code for code, action in enumerate(ACTIONS, 1)}, value=log.c.action),
+        )
+
+    with op.batch_alter_table('inventory_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_log_item_timestamp')
+        batch_op.drop_index('ix_inventory_log_user_timestamp')
+        batch_op.drop_index('ix_inventory_log_action_timestamp')
+    for name in TABLES:
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.drop_column('user')
+            batch_op.drop_column('item')
+            batch_op.drop_column('action')
+            batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.alter_column('stock_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.alter_column('action_code', new_column_name='action',
+                                  existing_type=sa.SmallInteger(), nullable=False)
+            batch_op.create_foreign_key(f'fk_{name}_user_id_user', 'user', ['user_id'], ['id'])
+            batch_op.create_foreign_key(f'fk_{name}_stock_id_stock', 'stock', ['stock_id'], ['id'])
+    op.create_index('ix_inventory_log_stock_timestamp', 'inventory_log', ['stock_id', 'timestamp'], unique=False)
+    op.create_index('ix_inventory_log_user_timestamp', 'inventory_log', ['user_id', 'timestamp'], unique=False)
+    op.create_index('ix_inventory_log_action_timestamp', 'inventory_log', ['action', 'timestamp'], unique=False)
+
+
+def downgrade():
+    conn = op.get_bind()
+    with op.batch_alter_table('inventory_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_log_action_timestamp')
+        batch_op.drop_index('ix_inventory_log_user_timestamp')
+        batch_op.drop_index('ix_inventory_log_stock_timestamp')
+    for name in TABLES:
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.drop_constraint(f'fk_{name}_stock_id_stock', type_='foreignkey')
+            batch_op.drop_constraint(f'fk_{name}_user_id_user', type_='foreignkey')
+            batch_op.alter_column('action', new_column_name='action_code', existing_type=sa.SmallInteger())
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('user', sa.String(length=64), nullable=True))
+            batch_op.add_column(sa.Column('item', sa.String(length=64), nullable=True))
+            batch_op.add_column(sa.Column('action', sa.String(length=128), nullable=True))
+
+    for log in (log_table(name) for name in TABLES):
+        backfill(
+            conn, log, log.c.user.is_(None),
+            user=sa.select(user.c.username).where(user.c.id == log.c.user_id).scalar_subquery(),
+            item=sa.select(stock.c.item).where(stock.c.id == log.c.stock_id).scalar_subquery(),
+            action=sa.case({code: action for code, action in enumerate(ACTIONS, 1)}, value=log.c.action_code),
+        )
+
+    for name in TABLES:
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.drop_column('user_id')
+            batch_op.drop_column('stock_id')
+            batch_op.drop_column('action_code')
+            batch_op.alter_column('user', existing_type=sa.String(length=64), nullable=False)
+            batch_op.alter_column('item', existing_type=sa.String(length=64), nullable=False)
+            batch_op.alter_column('action', existing_type=sa.String(length=128), nullable=False)
+    op.create_index('ix_inventory_log_item_timestamp', 'inventory_log', ['item', 'timestamp'], unique=False)
+    op.create_index('ix_inventory_log_user_timestamp', 'inventory_log', ['user', 'timestamp'], unique=False)
+    op.create_index('ix_inventory_log_action_timestamp', 'inventory_log', ['action', 'timestamp'], unique=False)
+
+    # Archived placeholder items go with the flag; their history is back to names.
+    conn.execute(stock.delete().where(stock.c.archived.is_(True)))
+    op.drop_column('stock', 'archived')
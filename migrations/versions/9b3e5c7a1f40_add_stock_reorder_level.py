@@ -0,0 +1,33 @@
+"""Add stock reorder levels and an index for low-stock lookups
+
+Revision ID: 9b3e5c7a1f40
+Revises: 0c94e1d6a8b2
+Create Date: 2026-10-18 18:12:04.518230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5c7a1f40'
+down_revision = '0c94e1d6a8b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reorder_level', sa.Integer(), server_default='0', nullable=False))
+
+    # Must match the Stock.headroom expression exactly for the planner to use it.
+    op.create_index(
+        'ix_stock_headroom', 'stock',
+        [sa.text('(stock - coalesce(used, 0) - reorder_level)')], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_stock_headroom', table_name='stock')
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.drop_column('reorder_level')
@@ -0,0 +1,40 @@
+"""Add usage_daily rollup table
+
+Revision ID: a3c91e5d7b20
+Revises: 78f7539484eb
+Create Date: 2026-10-18 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91e5d7b20'
+down_revision = '78f7539484eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('usage_daily',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('item', sa.String(length=64), nullable=False),
+    sa.Column('user', sa.String(length=64), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('action', sa.String(length=128), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('item', 'user', 'day', 'action', name='uq_usage_daily_key')
+    )
+    # Seed the rollup from existing history; `flask usage backfill` does the same.
+    op.execute(
+        'INSERT INTO usage_daily (item, "user", day, action, total) '
+        'SELECT item, "user", date(timestamp), action, SUM(quantity_used) '
+        'FROM inventory_log '
+        'GROUP BY item, "user", date(timestamp), action'
+    )
+
+
+def downgrade():
+    op.drop_table('usage_daily')
@@ -0,0 +1,28 @@
+"""Add data_version so every worker shares the cache version counters
+
+Revision ID: b6d0f3a8c512
+Revises: 7a4c2e9b1d38
+Create Date: 2026-10-19 09:12:40.281937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d0f3a8c512'
+down_revision = '7a4c2e9b1d38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('data_version',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,28 @@
+"""Make the usage_daily day index covering for forecasts and trend reports
+
+Revision ID: c5a8e2d14b97
+Revises: 9b3e5c7a1f40
+Create Date: 2026-10-18 19:40:51.306722
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a8e2d14b97'
+down_revision = '9b3e5c7a1f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usage_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_usage_daily_day_item_action_total', ['day', 'item', 'action', 'total'], unique=False)
+        batch_op.drop_index('ix_usage_daily_day_item')
+
+
+def downgrade():
+    with op.batch_alter_table('usage_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_usage_daily_day_item', ['day', 'item'], unique=False)
+        batch_op.drop_index('ix_usage_daily_day_item_action_total')
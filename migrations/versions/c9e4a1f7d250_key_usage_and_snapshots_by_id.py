@@ -0,0 +1,134 @@
+"""Key usage_daily and stock_snapshot by stock and user ids instead of names
+
+Revision ID: c9e4a1f7d250
+Revises: b6d0f3a8c512
+Create Date: 2026-10-19 14:36:08.517263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e4a1f7d250'
+down_revision = 'b6d0f3a8c512'
+branch_labels = None
+depends_on = None
+
+# Must match LOG_ACTIONS in app.py: codes are positions starting at 1.
+ACTIONS = ['Item Created', 'Restocked', 'Usage Logged']
+
+user = sa.table('user', sa.column('id'), sa.column('username'))
+stock = sa.table('stock', sa.column('id'), sa.column('item'), sa.column('stock'), sa.column('used'),
+                 sa.column('category'), sa.column('archived'))
+snapshot = sa.table('stock_snapshot', sa.column('taken_at'), sa.column('item'), sa.column('stock_id'),
+                    sa.column('stock'), sa.column('used'))
+logs = [
+    sa.table(name, sa.column('timestamp'), sa.column('user_id'), sa.column('stock_id'),
+             sa.column('quantity_used'), sa.column('action'))
+    for name in ('inventory_log', 'inventory_log_archive')
+]
+
+
+def log_totals():
+    """Per stock/user/day/action totals over the log and its archive."""
+    rows = sa.union_all(*(
+        sa.select(log.c.stock_id, log.c.user_id, log.c.timestamp, log.c.action, log.c.quantity_used)
+        for log in logs
+    )).subquery()
+    day = sa.func.date(rows.c.timestamp)
+    return (
+        sa.select(rows.c.stock_id, rows.c.user_id, day.label('day'), rows.c.action,
+                  sa.func.sum(rows.c.quantity_used).label('total'))
+        .group_by(rows.c.stock_id, rows.c.user_id, day, rows.c.action)
+    )
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # usage_daily only holds totals of the log, so it is rebuilt rather than converted.
+    op.drop_table('usage_daily')
+    usage_daily = op.create_table('usage_daily',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('stock_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('action', sa.SmallInteger(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['stock_id'], ['stock.id'], name='fk_usage_daily_stock_id_stock'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_usage_daily_user_id_user'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('stock_id', 'user_id', 'day', 'action', name='uq_usage_daily_key')
+    )
+    op.create_index('ix_usage_daily_day_stock_action_total', 'usage_daily',
+                    ['day', 'stock_id', 'action', 'total'], unique=False)
+    totals = log_totals().subquery()
+    conn.execute(usage_daily.insert().from_select(
+        ['stock_id', 'user_id', 'day', 'action', 'total'], sa.select(*totals.c)
+    ))
+
+    # Snapshots of items deleted or renamed since keep their history on an
+    # archived placeholder item holding the last snapshotted values.
+    orphans = conn.execute(
+        sa.select(snapshot.c.item).distinct().where(~snapshot.c.item.in_(sa.select(stock.c.item)))
+    ).scalars().all()
+    for name in sorted(orphans):
+        stock_value, used = conn.execute(
+            sa.select(snapshot.c.stock, snapshot.c.used).where(snapshot.c.item == name)
+            .order_by(snapshot.c.taken_at.desc()).limit(1)
+        ).one()
+        conn.execute(stock.insert().values(item=name, stock=stock_value, used=used, category='Misc',
+                                          archived=True))
+
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stock_id', sa.Integer(), nullable=True))
+    conn.execute(snapshot.update().values(
+        stock_id=sa.select(stock.c.id).where(stock.c.item == snapshot.c.item).scalar_subquery()
+    ))
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_stock_snapshot_taken_at_item', type_='unique')
+        batch_op.drop_column('item')
+        batch_op.alter_column('stock_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_stock_snapshot_stock_id_stock', 'stock', ['stock_id'], ['id'])
+        batch_op.create_unique_constraint('uq_stock_snapshot_taken_at_stock_id', ['taken_at', 'stock_id'])
+
+
+def downgrade():
+    conn = op.get_bind()
+
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('item', sa.String(length=64), nullable=True))
+    conn.execute(snapshot.update().values(
+        item=sa.select(stock.c.item).where(stock.c.id == snapshot.c.stock_id).scalar_subquery()
+    ))
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_stock_snapshot_taken_at_stock_id', type_='unique')
+        batch_op.drop_constraint('fk_stock_snapshot_stock_id_stock', type_='foreignkey')
+        batch_op.drop_column('stock_id')
+        batch_op.alter_column('item', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_unique_constraint('uq_stock_snapshot_taken_at_item', ['taken_at', 'item'])
+
+    op.drop_index('ix_usage_daily_day_stock_action_total', table_name='usage_daily')
+    op.drop_table('usage_daily')
+    usage_daily = op.create_table('usage_daily',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('item', sa.String(length=64), nullable=False),
+    sa.Column('user', sa.String(length=64), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('action', sa.String(length=128), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('item', 'user', 'day', 'action', name='uq_usage_daily_key')
+    )
+    op.create_index('ix_usage_daily_day_item_action_total', 'usage_daily',
+                    ['day', 'item', 'action', 'total'], unique=False)
+    totals = log_totals().subquery()
+    conn.execute(usage_daily.insert().from_select(
+        ['item', 'user', 'day', 'action', 'total'],
+        sa.select(stock.c.item, user.c.username, totals.c.day,
+                  sa.case({code: action for code, action in enumerate(ACTIONS, 1)}, value=totals.c.action),
+                  totals.c.total)
+        .join(stock, stock.c.id == totals.c.stock_id)
+        .join(user, user.c.id == totals.c.user_id)
+    ))
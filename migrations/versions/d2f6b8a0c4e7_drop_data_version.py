@@ -0,0 +1,28 @@
+"""Drop data_version: cache versions live in the cache backend again
+
+Revision ID: d2f6b8a0c4e7
+Revises: c9e4a1f7d250
+Create Date: 2026-10-19 16:20:45.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f6b8a0c4e7'
+down_revision = 'c9e4a1f7d250'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_table('data_version')
+
+
+def downgrade():
+    op.create_table('data_version',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
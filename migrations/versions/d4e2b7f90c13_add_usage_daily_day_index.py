@@ -0,0 +1,26 @@
+"""Index usage_daily by day for windowed trend queries
+
+Revision ID: d4e2b7f90c13
+Revises: a3c91e5d7b20
+Create Date: 2026-10-18 10:03:27.904411
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e2b7f90c13'
+down_revision = 'a3c91e5d7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usage_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_usage_daily_day_item', ['day', 'item'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('usage_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_usage_daily_day_item')
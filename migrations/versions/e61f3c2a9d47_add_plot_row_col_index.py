@@ -0,0 +1,26 @@
+"""Index plot by (row, col) for map tiles
+
+Revision ID: e61f3c2a9d47
+Revises: 5b8f0a61c2de
+Create Date: 2026-10-18 13:41:55.072618
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61f3c2a9d47'
+down_revision = '5b8f0a61c2de'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('plot', schema=None) as batch_op:
+        batch_op.create_index('ix_plot_row_col', ['row', 'col'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('plot', schema=None) as batch_op:
+        batch_op.drop_index('ix_plot_row_col')
@@ -0,0 +1,33 @@
+"""Add stock_snapshot for point-in-time stock queries
+
+Revision ID: e8f1a4c3b692
+Revises: c5a8e2d14b97
+Create Date: 2026-10-18 21:02:37.158804
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8f1a4c3b692'
+down_revision = 'c5a8e2d14b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.Column('log_id', sa.Integer(), nullable=False),
+    sa.Column('item', sa.String(length=64), nullable=False),
+    sa.Column('stock', sa.Integer(), nullable=False),
+    sa.Column('used', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('taken_at', 'item', name='uq_stock_snapshot_taken_at_item')
+    )
+
+
+def downgrade():
+    op.drop_table('stock_snapshot')
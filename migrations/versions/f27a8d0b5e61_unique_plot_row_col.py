@@ -0,0 +1,36 @@
+"""Make plot (row, col) unique
+
+Revision ID: f27a8d0b5e61
+Revises: e61f3c2a9d47
+Create Date: 2026-10-18 14:22:03.611479
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f27a8d0b5e61'
+down_revision = 'e61f3c2a9d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Older rows could share a cell because placement used to be check-then-insert.
+    # Keep the lowest id in each cell and unplace the rest so the index can be built.
+    op.execute(
+        'UPDATE plot SET "row" = NULL, col = NULL '
+        'WHERE "row" IS NOT NULL AND col IS NOT NULL AND id NOT IN ('
+        '  SELECT MIN(id) FROM plot WHERE "row" IS NOT NULL AND col IS NOT NULL GROUP BY "row", col'
+        ')'
+    )
+    with op.batch_alter_table('plot', schema=None) as batch_op:
+        batch_op.drop_index('ix_plot_row_col')
+        batch_op.create_index('uq_plot_row_col', ['row', 'col'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('plot', schema=None) as batch_op:
+        batch_op.drop_index('uq_plot_row_col')
+        batch_op.create_index('ix_plot_row_col', ['row', 'col'], unique=False)